@@ -0,0 +1,312 @@
+#!/usr/bin/env python
+"""Benchmarks for loading and plotting functions on synthetic cases.
+
+Usage::
+
+    python -m pynhtf.benchmarks run --scale medium -o baseline.json
+    python -m pynhtf.benchmarks compare baseline.json current.json
+    python -m pynhtf.benchmarks imports
+"""
+
+from __future__ import division, print_function
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+
+# Synthetic case sizes
+scales = {"small": dict(nt=1000, nelements=16, nz=11, ny=41, nprobes=1),
+          "medium": dict(nt=20000, nelements=32, nz=21, ny=41, nprobes=1),
+          "large": dict(nt=200000, nelements=64, nz=41, ny=81, nprobes=1)}
+
+# Import time budgets in seconds for orchestration modules, which must also
+# not pull in any of the ``heavy_modules``
+import_budgets = {"run": 0.5,
+                  "pynhtf.sweeps": 0.3,
+                  "pynhtf.schedulers": 0.1}
+heavy_modules = ["matplotlib", "pandas", "pynhtf.processing"]
+
+_import_code = """
+import json, sys, time
+t0 = time.perf_counter()
+import {module}
+dt = time.perf_counter() - t0
+print(json.dumps({{"time": dt, "heavy": [m for m in {heavy!r}
+                                         if m in sys.modules]}}))
+"""
+
+
+def _write_csv(fpath, columns, data):
+    np.savetxt(fpath, data, delimiter=",", header=",".join(columns),
+               comments="")
+
+
+def gen_case(case_dir, nt=1000, nelements=16, nz=11, ny=41, nprobes=1,
+             dt=0.001, seed=0):
+    """Generate a synthetic ``postProcessing`` tree in ``case_dir``.
+
+    ``nt`` is the number of time steps for the turbine, actuator line element
+    and probe histories, ``nz`` and ``ny`` set the number and resolution of
+    the sampled wake profiles.
+    """
+    rng = np.random.RandomState(seed)
+    pp = os.path.join(case_dir, "postProcessing")
+    t = np.arange(1, nt + 1)*dt
+    # Sampled wake profiles
+    sets_dir = os.path.join(pp, "sets", "{:g}".format(t[-1]))
+    os.makedirs(sets_dir)
+    y = np.linspace(-1.1175, 1.1175, ny)
+    for z_R in np.linspace(-1.6, 1.6, nz):
+        prefix = os.path.join(sets_dir, "turbine2_{}_".format(float(z_R)))
+        _write_csv(prefix + "UMean.csv", ["y", "UMean_0", "UMean_1",
+                                          "UMean_2"],
+                   np.column_stack([y, 10 + rng.normal(size=(ny, 3))]))
+        _write_csv(prefix + "UPrime2Mean.csv",
+                   ["y"] + ["UPrime2Mean_{}".format(i) for i in range(6)],
+                   np.column_stack([y, rng.uniform(size=(ny, 6))]))
+        _write_csv(prefix + "kMean.csv", ["y", "kMean"],
+                   np.column_stack([y, rng.uniform(size=ny)]))
+    # Turbine performance
+    turbines_dir = os.path.join(pp, "turbines", "0")
+    os.makedirs(turbines_dir)
+    for turbine in ["turbine1", "turbine2"]:
+        _write_csv(os.path.join(turbines_dir, turbine + ".csv"),
+                   ["time", "angle_deg", "tsr", "cp", "cd"],
+                   np.column_stack([t, (t*360) % 360,
+                                    6 + 0.1*rng.normal(size=nt),
+                                    0.45 + 0.01*rng.normal(size=nt),
+                                    0.9 + 0.01*rng.normal(size=nt)]))
+    # Actuator line elements
+    elements_dir = os.path.join(pp, "actuatorLineElements", "0")
+    os.makedirs(elements_dir)
+    r = np.linspace(0.05, 0.47, nelements)
+    for i in range(nelements):
+        _write_csv(os.path.join(elements_dir,
+                                "blade1Element{}.csv".format(i)),
+                   ["time", "x", "y", "z", "fx", "fy", "fz"],
+                   np.column_stack([t, np.zeros(nt), r[i]*np.cos(t),
+                                    r[i]*np.sin(t),
+                                    rng.normal(size=(nt, 3))]))
+    # Velocity probes
+    probes_dir = os.path.join(pp, "probes", "0")
+    os.makedirs(probes_dir)
+    vel = 10 + rng.normal(size=(nt, nprobes, 3))
+    with open(os.path.join(probes_dir, "U"), "w") as f:
+        for n in range(nprobes):
+            f.write("# Probe {} (0.1 {} 0.05)\n".format(n, 0.01*n))
+        f.write("#       Time\n")
+        for ti, vi in zip(t, vel):
+            f.write("{:g}".format(ti) + "".join(
+                "  ({} {} {})".format(*v) for v in vi) + "\n")
+
+
+def _benchmarks():
+    """Return a dict of benchmark name to function."""
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    from pynhtf import processing as pr
+    from pynhtf import plotting
+
+    def plot_spanwise():
+        plotting.plot_spanwise()
+        plt.close("all")
+
+    return {"load_vel_map": lambda: pr.load_vel_map(turbine="turbine2"),
+            "load_k_map": pr.load_k_map,
+            "load_perf": lambda: pr.load_perf(verbose=False),
+            "load_vel_probes": pr.load_vel_probes,
+            "plot_spanwise": plot_spanwise}
+
+
+def time_func(func, repeat=3):
+    """Return the minimum wall time of ``func`` over ``repeat`` calls and its
+    peak traced memory in bytes.
+
+    Memory is measured in a separate call, since tracing slows ``func`` down
+    too much for the timings to be meaningful.
+    """
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - t0)
+    tracemalloc.start()
+    try:
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {"time": min(times), "peak_mem": peak}
+
+
+def run_benchmarks(scale="small", repeat=3, names=None, verbose=True,
+                   **kwargs):
+    """Generate a synthetic case and time each benchmark in it.
+
+    ``kwargs`` override the sizes of the selected ``scale``. Failing
+    benchmarks are recorded with their error message.
+    """
+    sizes = dict(scales[scale])
+    sizes.update(kwargs)
+    case_dir = tempfile.mkdtemp(prefix="pynhtf-bench-")
+    cwd = os.getcwd()
+    results = {}
+    try:
+        gen_case(case_dir, **sizes)
+        os.chdir(case_dir)
+        for name, func in _benchmarks().items():
+            if names and name not in names:
+                continue
+            try:
+                results[name] = time_func(func, repeat=repeat)
+            except Exception as e:
+                results[name] = {"error": "{}: {}".format(
+                                 type(e).__name__, e)}
+            if verbose:
+                r = results[name]
+                if "error" in r:
+                    print("{:18s} {}".format(name, r["error"]))
+                else:
+                    print("{:18s} {:9.4f} s {:9.1f} MB".format(
+                          name, r["time"], r["peak_mem"]/1e6))
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(case_dir)
+    return {"scale": scale, "sizes": sizes,
+            "python": platform.python_version(),
+            "numpy": np.__version__, "results": results}
+
+
+def compare(baseline, current, threshold=0.2, verbose=True):
+    """Compare two benchmark result dicts. Returns a list of regressions,
+    i.e., time or peak memory more than ``threshold`` (fractional) above the
+    baseline.
+    """
+    if verbose and baseline["sizes"] != current["sizes"]:
+        print("Warning: case sizes differ from baseline")
+    regressions = []
+    for name, b in baseline["results"].items():
+        c = current["results"].get(name)
+        if c is None or "error" in b:
+            continue
+        if "error" in c:
+            regressions.append((name, "error", c["error"]))
+            continue
+        for key in ["time", "peak_mem"]:
+            ratio = c[key]/b[key] if b[key] else np.inf
+            if ratio > 1 + threshold:
+                regressions.append((name, key, ratio))
+    if verbose:
+        for name, key, val in regressions:
+            if key == "error":
+                print("REGRESSION {}: {}".format(name, val))
+            else:
+                print("REGRESSION {} {}: {:.2f}x baseline".format(
+                      name, key, val))
+        if not regressions:
+            print("No regressions")
+    return regressions
+
+
+def time_import(module, repeat=3, case_dir="."):
+    """Time importing ``module`` in fresh interpreters run from ``case_dir``.
+    Returns the minimum import time and the list of heavy modules loaded, or
+    the error message if the import fails.
+    """
+    times = []
+    for _ in range(repeat):
+        try:
+            out = subprocess.check_output(
+                [sys.executable, "-c",
+                 _import_code.format(module=module, heavy=heavy_modules)],
+                cwd=case_dir, stderr=subprocess.STDOUT)
+        except subprocess.CalledProcessError as e:
+            lines = e.output.decode().strip().split("\n")
+            return {"error": lines[-1] if lines[-1] else str(e)}
+        res = json.loads(out.decode().strip().split("\n")[-1])
+        times.append(res["time"])
+    return {"time": min(times), "heavy": res["heavy"]}
+
+
+def check_imports(budgets=import_budgets, repeat=3, case_dir=".",
+                  verbose=True):
+    """Check import times against ``budgets``. Returns a list of failures."""
+    failures = []
+    for module, budget in budgets.items():
+        res = time_import(module, repeat=repeat, case_dir=case_dir)
+        if "error" in res:
+            failures.append((module, res))
+            if verbose:
+                print("{:18s} FAIL; {}".format(module, res["error"]))
+            continue
+        ok = res["time"] <= budget and not res["heavy"]
+        if not ok:
+            failures.append((module, res))
+        if verbose:
+            print("{:18s} {:7.3f} s (budget {:.3f} s) {}{}".format(
+                  module, res["time"], budget, "ok" if ok else "FAIL",
+                  "; loads " + ", ".join(res["heavy"]) if res["heavy"]
+                  else ""))
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark pynhtf loaders "
+                                     "and plots on synthetic cases")
+    subparsers = parser.add_subparsers(dest="command")
+    p_run = subparsers.add_parser("run", help="Run benchmarks")
+    p_run.add_argument("--scale", default="small", choices=list(scales))
+    for k in scales["small"]:
+        p_run.add_argument("--" + k, type=int,
+                           help="Override {} of the scale".format(k))
+    p_run.add_argument("--repeat", default=3, type=int)
+    p_run.add_argument("--only", nargs="*", help="Benchmarks to run")
+    p_run.add_argument("--output", "-o", help="Save results as JSON")
+    p_gen = subparsers.add_parser("generate", help="Generate synthetic case")
+    p_gen.add_argument("case_dir")
+    p_gen.add_argument("--scale", default="small", choices=list(scales))
+    p_cmp = subparsers.add_parser("compare", help="Compare results to a "
+                                  "baseline")
+    p_cmp.add_argument("baseline")
+    p_cmp.add_argument("current")
+    p_cmp.add_argument("--threshold", default=0.2, type=float,
+                       help="Allowed fractional increase")
+    p_imp = subparsers.add_parser("imports", help="Check import times of "
+                                  "orchestration modules against budgets")
+    p_imp.add_argument("--repeat", default=3, type=int)
+    args = parser.parse_args(argv)
+
+    if args.command == "run":
+        sizes = {k: getattr(args, k) for k in scales["small"]
+                 if getattr(args, k) is not None}
+        res = run_benchmarks(args.scale, repeat=args.repeat, names=args.only,
+                             **sizes)
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump(res, f, indent=4)
+    elif args.command == "generate":
+        gen_case(args.case_dir, **scales[args.scale])
+    elif args.command == "compare":
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(args.current) as f:
+            current = json.load(f)
+        if compare(baseline, current, threshold=args.threshold):
+            sys.exit(1)
+    elif args.command == "imports":
+        if check_imports(repeat=args.repeat):
+            sys.exit(1)
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
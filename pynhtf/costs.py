@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+"""Wall time, core-hour and disk usage estimates for planned runs.
+
+The wall time model is linear in the work per time step::
+
+    t_step = a*ncells/nprocs + b*nturbines + c
+
+and is fit to timing records logged from past runs when enough of them are
+available.
+"""
+
+from __future__ import division, print_function
+import csv
+import math
+import os
+import re
+
+timings_fpath = "processed/timings.csv"
+timing_fields = ["ncells", "nprocs", "nturbines", "dt", "nsteps",
+                 "clock_time"]
+
+# Seconds per time step, used until enough timing records are available
+default_coeffs = {"cell": 1e-5, "turbine": 0.05, "const": 0.01}
+
+# Field components written per cell in each time directory: U, p, nut, k,
+# plus UMean, UPrime2Mean, pMean, nutMean and kMean from fieldAverage
+ncomponents = 18
+
+# Approximate gzip compression ratio for ASCII field files
+ascii_compression = 0.4
+
+
+def read_dict_value(fpath, keyword):
+    """Read a single-line value from an OpenFOAM dictionary as a string."""
+    with open(fpath) as f:
+        for line in f:
+            m = re.match(r"\s*{}\s+([^;]+);".format(keyword), line)
+            if m:
+                return m.group(1).strip()
+    raise KeyError("{} not found in {}".format(keyword, fpath))
+
+
+def parse_log(fpath="log.pimpleFoam"):
+    """Parse a solver log for the number of time steps and final clock time
+    in seconds.
+    """
+    nsteps = 0
+    clock_time = None
+    with open(fpath) as f:
+        for line in f:
+            if line.startswith("Time = "):
+                nsteps += 1
+            elif "ClockTime" in line:
+                clock_time = float(line.split("ClockTime =")[1].split()[0])
+    return {"nsteps": nsteps, "clock_time": clock_time}
+
+
+def record_timing(ncells, nprocs, nturbines, dt, log_fpath="log.pimpleFoam",
+                  fpath=timings_fpath):
+    """Append the timing of a finished run to the timing records."""
+    rec = parse_log(log_fpath)
+    if not rec["nsteps"] or rec["clock_time"] is None:
+        return
+    rec.update(ncells=ncells, nprocs=nprocs, nturbines=nturbines, dt=dt)
+    append_timings([rec], fpath=fpath)
+
+
+def append_timings(records, fpath=timings_fpath):
+    """Append a list of timing record dicts to the timing records."""
+    if not records:
+        return
+    if not os.path.isdir(os.path.dirname(fpath)):
+        os.makedirs(os.path.dirname(fpath))
+    new = not os.path.isfile(fpath)
+    with open(fpath, "a") as f:
+        writer = csv.DictWriter(f, fieldnames=timing_fields)
+        if new:
+            writer.writeheader()
+        writer.writerows(records)
+
+
+def load_timings(fpath=timings_fpath):
+    """Load timing records as a list of dicts."""
+    if not os.path.isfile(fpath):
+        return []
+    with open(fpath) as f:
+        return [{k: float(v) for k, v in row.items()}
+                for row in csv.DictReader(f)]
+
+
+def fit_cost_model(records, min_records=3):
+    """Fit the per-step cost coefficients to timing records by least squares.
+
+    Returns the defaults if there are fewer than ``min_records`` records.
+    """
+    if len(records) < min_records:
+        return dict(default_coeffs)
+    import numpy as np
+    A = np.array([[r["ncells"]/r["nprocs"], r["nturbines"], 1.0]
+                  for r in records])
+    b = np.array([r["clock_time"]/r["nsteps"] for r in records])
+    x = np.linalg.lstsq(A, b, rcond=None)[0]
+    x = np.maximum(x, 0)
+    return {"cell": x[0], "turbine": x[1], "const": x[2]}
+
+
+def estimate_run(ncells, nprocs=1, nturbines=2, dt=0.001, end_time=1.5,
+                 write_interval=0.005, write_format="ascii",
+                 write_precision=12, compressed=True, coeffs=None):
+    """Estimate wall time in seconds, core-hours and disk usage in bytes for
+    a single run.
+    """
+    if coeffs is None:
+        coeffs = default_coeffs
+    nsteps = int(round(end_time/dt))
+    nwrites = int(math.floor(end_time/write_interval + 1e-9))
+    t_step = (coeffs["cell"]*ncells/nprocs + coeffs["turbine"]*nturbines
+              + coeffs["const"])
+    wall_time = nsteps*t_step
+    if write_format == "ascii":
+        # Digits plus sign, decimal point, exponent and separator
+        bytes_per_value = write_precision + 8
+        if compressed:
+            bytes_per_value *= ascii_compression
+    else:
+        bytes_per_value = 8
+    disk = nwrites*ncells*ncomponents*bytes_per_value
+    return {"nsteps": nsteps, "nwrites": nwrites, "wall_time": wall_time,
+            "core_hours": wall_time*nprocs/3600, "disk": disk}
+
+
+def pack_points(wall_times, nprocs=1, cores_per_node=32, max_walltime=None):
+    """Pack runs onto nodes using first-fit decreasing on predicted wall time.
+
+    Each node runs ``cores_per_node//nprocs`` runs concurrently, with runs in
+    each slot executed back to back up to ``max_walltime`` seconds. Returns a
+    list of nodes, each a list of slots containing run indices.
+    """
+    nslots = max(cores_per_node//nprocs, 1)
+    order = sorted(range(len(wall_times)), key=lambda i: -wall_times[i])
+    nodes = []
+    loads = []
+    for i in order:
+        w = wall_times[i]
+        target = None
+        for n in range(len(nodes)):
+            for s in range(nslots):
+                if not nodes[n][s]:
+                    fits = True
+                elif max_walltime is None:
+                    fits = False
+                else:
+                    fits = loads[n][s] + w <= max_walltime
+                if fits:
+                    target = (n, s)
+                    break
+            if target is not None:
+                break
+        if target is None:
+            nodes.append([[] for s in range(nslots)])
+            loads.append([0.0]*nslots)
+            target = (len(nodes) - 1, 0)
+        n, s = target
+        nodes[n][s].append(i)
+        loads[n][s] += w
+    return nodes
+
+
+def check_disk(disk, quota=None, write_format="ascii", write_interval=0.005,
+               dt=0.001):
+    """Return a list of warnings about the predicted output volume."""
+    warnings = []
+    if quota is not None and disk > quota:
+        warnings.append("Predicted output of {:.1f} GB exceeds quota of "
+                        "{:.1f} GB".format(disk/1e9, quota/1e9))
+    if write_format == "ascii" and write_interval < 10*dt:
+        warnings.append("writeFormat ascii with writeInterval {} (every {} "
+                        "steps); consider binary or a larger "
+                        "writeInterval".format(write_interval,
+                                               int(round(write_interval/dt))))
+    return warnings
@@ -2,9 +2,13 @@
 """Plotting functions."""
 
 from __future__ import division, print_function
+import os
 import matplotlib.pyplot as plt
+import numpy as np
 import pandas as pd
-from .processing import *
+from .processing import (R, U, U_infty, load_vel_map, load_upup_profile,
+                         load_u_profile, load_perf, load_exp_perf)
+from . import recovery
 
 labels = {"meanu" : r"$U/U_\infty$",
           "stdu" : r"$\sigma_u/U_\infty$",
@@ -51,13 +55,13 @@ def plot_spanwise(save=False):
     for e in elements:
         i = int(e.replace("blade1Element", "").replace(".csv", ""))
         df = pd.read_csv(os.path.join(elements_dir, e))
-        r_R[i] = np.sqrt(df.y**2 + df.z**2).iloc[-1]/R
+        r_R[i] = np.sqrt(df.y**2 + df.z**2).iloc[-1]/R["turbine1"]
         fx[i] = df.fx.iloc[-1]
         ft[i] = np.sqrt(df.fy**2 + df.fz**2).iloc[-1]
     fig, ax = plt.subplots(nrows=1, ncols=2, figsize=(7.5, 3.25))
-    ax[0].plot(r_R, 2*ft/(U_infty**2*R))
+    ax[0].plot(r_R, 2*ft/(U_infty**2*R["turbine1"]))
     ax[0].set_ylabel(r"$F_\theta / (\rho R U_\infty^2)$")
-    ax[1].plot(r_R, 2*fx/(R*U_infty**2))
+    ax[1].plot(r_R, 2*fx/(R["turbine1"]*U_infty**2))
     ax[1].set_ylabel(r"$F_x / (\rho R U_\infty^2 )$")
     for a in ax:
         a.set_xlabel("$r/R$")
@@ -206,3 +210,20 @@ def plot_profiles(save=False):
         figname = "wake-profiles"
         plt.savefig("figures/" + figname + ".pdf")
         plt.savefig("figures/" + figname + ".png", dpi=300)
+
+
+def make_recovery_bar_chart(turbine="turbine2", ax=None, save=False):
+    """Plot the rotor-area-averaged MKE transport terms as a bar chart."""
+    budget = recovery.calc_mke_budget(turbine=turbine)
+    if ax is None:
+        fig, ax = plt.subplots(figsize=(7.5, 3.2))
+    names = list(budget.index)
+    ax.bar(range(len(names)), budget.values, color="gray", edgecolor="black")
+    ax.set_xticks(range(len(names)))
+    ax.set_xticklabels([recovery.labels[n] for n in names])
+    ax.axhline(0, color="black", linewidth=0.5)
+    ax.set_ylabel(r"$\frac{D}{U_\infty^3}\times$ mean of term")
+    ax.figure.tight_layout()
+    if save:
+        plt.savefig("figures/recovery-bar-chart.pdf")
+        plt.savefig("figures/recovery-bar-chart.png", dpi=300)
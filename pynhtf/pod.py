@@ -0,0 +1,258 @@
+#!/usr/bin/env python
+"""Streaming snapshot proper orthogonal decomposition (POD) of turbine wakes.
+
+Snapshots are read one batch at a time and folded into a rank-``k`` basis
+with an incremental SVD, so memory use is bounded by the batch size and rank
+rather than the number of snapshots.
+
+Snapshots can be read from reconstructed time directories (``source="fields"``),
+which requires cell centres written with
+``postProcess -func writeCellCentres -time 0``, or from sampled sets
+(``source="sets"``) that include the instantaneous ``U`` field.
+"""
+
+from __future__ import division, print_function
+import gzip
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from .processing import R, D
+
+# Default streamwise rotor locations
+turbine_x = {"turbine1": 0.0, "turbine2": 2.682}
+
+
+def _read_text(fpath):
+    if not os.path.isfile(fpath) and os.path.isfile(fpath + ".gz"):
+        fpath += ".gz"
+    if fpath.endswith(".gz"):
+        with gzip.open(fpath, "rt") as f:
+            return f.read()
+    with open(fpath) as f:
+        return f.read()
+
+
+def read_vector_field(fpath):
+    """Read the ``internalField`` of an ASCII OpenFOAM vector field file.
+    Returns an array of shape ``(ncells, 3)``.
+    """
+    txt = _read_text(fpath)
+    i = txt.index("internalField")
+    header, body = txt[i:].split("\n", 1)
+    if "nonuniform" not in header:
+        raise ValueError("{} does not have a nonuniform internalField".format(
+                         fpath))
+    n, body = body.split("(", 1)
+    n = int(n.strip())
+    # Each vector is on its own line, so only read the next n lines
+    lines = body.split("\n", n + 1)[1:n + 1]
+    vals = np.array(" ".join(lines).replace("(", " ").replace(")", " ").split(),
+                    dtype=float)
+    if len(vals) != 3*n:
+        raise ValueError("Could not parse {} (binary format?)".format(fpath))
+    return vals.reshape((n, 3))
+
+
+def get_snapshot_times(source="fields", t1=0.0):
+    """List snapshot time directory names at or after ``t1``, sorted by
+    time.
+    """
+    if source == "fields":
+        case_dir = "."
+    else:
+        case_dir = os.path.join("postProcessing", "sets")
+    times = []
+    for d in os.listdir(case_dir):
+        try:
+            t = float(d)
+        except ValueError:
+            continue
+        if t >= t1 and t > 0 and os.path.isdir(os.path.join(case_dir, d)):
+            times.append((t, d))
+    return [d for t, d in sorted(times)]
+
+
+def get_wake_mask(turbine="turbine2", length_D=2.0, radius_R=1.5, x0=None,
+                  time="0"):
+    """Select cells in the wake region downstream of ``turbine``, extending
+    ``length_D`` diameters downstream and ``radius_R`` radii from the rotor
+    axis. Returns a boolean array over all cells.
+    """
+    if x0 is None:
+        x0 = turbine_x[turbine]
+    c = read_vector_field(os.path.join(time, "C"))
+    r = np.sqrt(c[:, 1]**2 + c[:, 2]**2)
+    return ((c[:, 0] >= x0) & (c[:, 0] <= x0 + length_D*D[turbine])
+            & (r <= radius_R*R[turbine]))
+
+
+def read_sets_snapshot(time, turbine="turbine2", field="U"):
+    """Read all sampled profiles of ``field`` behind ``turbine`` at ``time``
+    as an array of shape ``(npoints, 3)``.
+    """
+    data_dir = os.path.join("postProcessing", "sets", time)
+    suffix = "_{}.csv".format(field)
+    z_R = sorted(float(f.split("_")[1]) for f in os.listdir(data_dir)
+                 if f.startswith(turbine + "_") and f.endswith(suffix))
+    if not z_R:
+        raise ValueError("No {} sets for {} in {}".format(field, turbine,
+                         data_dir))
+    vel = []
+    for zi in z_R:
+        dfi = pd.read_csv(os.path.join(data_dir, "{}_{}{}".format(
+                          turbine, zi, suffix)))
+        vel.append(dfi[[field + "_{}".format(i) for i in range(3)]].values)
+    return np.concatenate(vel)
+
+
+_worker_mask = None
+
+
+def _init_worker(mask):
+    global _worker_mask
+    _worker_mask = mask
+
+
+def _read_snapshot(args):
+    """Read a single snapshot as a flat array."""
+    time, source, turbine, field = args
+    if source == "fields":
+        vel = read_vector_field(os.path.join(time, field))
+        if _worker_mask is not None:
+            vel = vel[_worker_mask]
+    else:
+        vel = read_sets_snapshot(time, turbine=turbine, field=field)
+    return vel.ravel()
+
+
+class IncrementalPOD(object):
+    """Rank-``k`` POD updated one batch of snapshots at a time.
+
+    Follows the incremental PCA update of Ross et al. (2008), which also
+    tracks the snapshot mean so modes describe fluctuations about it. The
+    sum of squared fluctuations is tracked alongside, so modal energy can be
+    expressed as a fraction of the total rather than of the retained modes.
+    """
+    def __init__(self, rank=10):
+        self.rank = rank
+        self.n = 0
+        self.sum_sq = 0.0
+        self.mean = None
+        self.modes = None
+        self.singular_values = None
+
+    def update(self, X):
+        """Add a batch of snapshots ``X`` with shape
+        ``(nsnapshots, nfeatures)``.
+        """
+        X = np.asarray(X, dtype=float)
+        nb = len(X)
+        mean_b = X.mean(axis=0)
+        sum_sq_b = np.sum((X - mean_b)**2)
+        if self.n == 0:
+            M = X - mean_b
+            mean = mean_b
+            self.sum_sq = sum_sq_b
+        else:
+            n_tot = self.n + nb
+            mean = (self.n*self.mean + nb*mean_b)/n_tot
+            corr = np.sqrt(self.n*nb/n_tot)*(self.mean - mean_b)
+            M = np.vstack((self.singular_values[:, None]*self.modes,
+                           X - mean_b, corr))
+            self.sum_sq += sum_sq_b + np.sum(corr**2)
+        _, s, vt = np.linalg.svd(M, full_matrices=False)
+        self.modes = vt[:self.rank]
+        self.singular_values = s[:self.rank]
+        self.mean = mean
+        self.n += nb
+
+    @property
+    def energy(self):
+        """Modal energy, i.e., eigenvalues of the snapshot covariance."""
+        return self.singular_values**2/max(self.n - 1, 1)
+
+    @property
+    def total_energy(self):
+        """Total fluctuation energy, i.e., trace of the snapshot covariance."""
+        return self.sum_sq/max(self.n - 1, 1)
+
+
+def _iter_batches(pool, times, batch_size, source, turbine, field):
+    for i in range(0, len(times), batch_size):
+        args = [(t, source, turbine, field) for t in times[i:i + batch_size]]
+        if pool is None:
+            batch = [_read_snapshot(a) for a in args]
+        else:
+            batch = list(pool.map(_read_snapshot, args))
+        yield times[i:i + batch_size], np.array(batch)
+
+
+def calc_pod(turbine="turbine2", source="fields", field="U", rank=10,
+             batch_size=20, t1=0.0, nprocs=None, coeffs=True, save=True,
+             verbose=True, **kwargs):
+    """Calculate the POD of the wake of ``turbine`` from streamed snapshots.
+
+    Snapshots are read and parsed on a process pool with ``nprocs`` workers
+    (``nprocs=1`` reads in the calling process). ``kwargs`` are passed to
+    ``get_wake_mask`` when ``source="fields"``. If ``coeffs`` is ``True``, a
+    second pass projects each snapshot onto the modes to obtain temporal
+    coefficients. If ``save`` is ``True``, results are written to
+    ``processed/pod``.
+
+    Returns a dict with ``modes`` (shape ``(rank, npoints, 3)``), ``mean``,
+    ``energy`` (`DataFrame`) and, optionally, ``coeffs`` (`DataFrame` indexed
+    by time).
+    """
+    times = get_snapshot_times(source=source, t1=t1)
+    if not times:
+        raise ValueError("No snapshots found")
+    mask = None
+    if source == "fields":
+        mask = get_wake_mask(turbine=turbine, **kwargs)
+    if nprocs == 1:
+        _init_worker(mask)
+        pool = None
+    else:
+        pool = ProcessPoolExecutor(max_workers=nprocs,
+                                   initializer=_init_worker, initargs=(mask,))
+    pod = IncrementalPOD(rank=rank)
+    try:
+        for batch_times, X in _iter_batches(pool, times, batch_size, source,
+                                            turbine, field):
+            pod.update(X)
+            if verbose:
+                print("POD updated with {}/{} snapshots".format(pod.n,
+                                                                len(times)))
+        res = {"modes": pod.modes.reshape((len(pod.modes), -1, 3)),
+               "mean": pod.mean.reshape((-1, 3))}
+        energy = pd.DataFrame({"mode": np.arange(len(pod.energy)),
+                               "energy": pod.energy})
+        energy["energy_frac"] = energy.energy/pod.total_energy
+        energy["energy_cum"] = energy.energy_frac.cumsum()
+        res["energy"] = energy
+        if coeffs:
+            a = []
+            for batch_times, X in _iter_batches(pool, times, batch_size,
+                                                source, turbine, field):
+                a.append((X - pod.mean) @ pod.modes.T)
+            a = np.concatenate(a)
+            res["coeffs"] = pd.DataFrame(
+                a, index=pd.Index([float(t) for t in times], name="time"),
+                columns=["a_{}".format(i) for i in range(a.shape[1])])
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    if save:
+        save_dir = os.path.join("processed", "pod")
+        if not os.path.isdir(save_dir):
+            os.makedirs(save_dir)
+        prefix = os.path.join(save_dir, "{}_{}_".format(turbine, source))
+        np.save(prefix + "modes.npy", res["modes"])
+        np.save(prefix + "mean.npy", res["mean"])
+        if mask is not None:
+            np.save(prefix + "mask.npy", mask)
+        res["energy"].to_csv(prefix + "energy.csv", index=False)
+        if coeffs:
+            res["coeffs"].to_csv(prefix + "coeffs.csv")
+    return res
@@ -2,14 +2,9 @@
 """Processing functions."""
 
 from __future__ import division, print_function
-import matplotlib.pyplot as plt
-import re
 import numpy as np
 import os
 import glob
-import sys
-import foampy
-from pxl import fdiff
 import pandas as pd
 
 # Some constants
@@ -19,6 +14,7 @@ A = {turbine: np.pi*r**2 for turbine, r in R.items()}
 U = 10.0
 U_infty = U
 rho = 1.2
+nu = 1.5e-5
 
 
 def load_u_profile(turbine="turbine2", z_R=0.0):
@@ -37,34 +33,44 @@ def load_u_profile(turbine="turbine2", z_R=0.0):
     return df
 
 
-def load_vel_map(turbine="turbine2", component="u"):
-    """Load all mean streamwise velocity profiles. Returns a `DataFrame` with
-    `z_R` as the index and `y_R` as columns.
+def _load_sets_map(turbine, quantity, column):
+    """Load column ``column`` of all sampled ``quantity`` profiles behind
+    ``turbine``. Returns a `DataFrame` with `z_R` as the index and `y_R` as
+    columns.
     """
-    # Define columns in set raw data file
-    columns = dict(u=0, v=1, w=2)
     sets_dir = os.path.join("postProcessing", "sets")
     latest_time = max(os.listdir(sets_dir))
     data_dir = os.path.join(sets_dir, latest_time)
     flist = os.listdir(data_dir)
+    suffix = "_{}.csv".format(quantity)
     z_R = []
     for fname in flist:
-        if "UMean" in fname:
+        if fname.startswith(turbine + "_") and fname.endswith(suffix):
             z_R.append(float(fname.split("_")[1]))
     z_R.sort()
     z_R.reverse()
-    vel = []
+    vals = []
     for zi in z_R:
-        fname = "{}_{}_UMean.csv".format(turbine, zi)
+        fname = "{}_{}{}".format(turbine, zi, suffix)
         dfi = pd.read_csv(os.path.join(data_dir, fname))
-        vel.append(dfi["UMean_{}".format(columns[component])].values)
+        vals.append(dfi[column].values)
     y_R = dfi["y"]/R[turbine]
     z_R = np.asarray(z_R)
-    vel = np.asarray(vel).reshape((len(z_R), len(y_R)))
-    df = pd.DataFrame(vel, index=z_R, columns=y_R)
+    vals = np.asarray(vals).reshape((len(z_R), len(y_R)))
+    df = pd.DataFrame(vals, index=z_R, columns=y_R)
     return df
 
 
+def load_vel_map(turbine="turbine2", component="u"):
+    """Load all mean streamwise velocity profiles. Returns a `DataFrame` with
+    `z_R` as the index and `y_R` as columns.
+    """
+    # Define columns in set raw data file
+    columns = dict(u=0, v=1, w=2)
+    return _load_sets_map(turbine, "UMean",
+                          "UMean_{}".format(columns[component]))
+
+
 def load_k_profile(turbine="turbine2", z_R=0.0):
     """Load data from the sampled `UPrime2Mean` and `kMean` (if available) and
     return it as a pandas `DataFrame`.
@@ -107,7 +113,7 @@ def load_k_map(amount="total"):
     z_H.reverse()
     k = []
     for z_H_i in z_H:
-        dfi = load_k_profile(z_H_i)
+        dfi = load_k_profile(z_R=z_H_i)
         k.append(dfi["k_" + amount].values)
     y_R = dfi.y_R.values
     k = np.array(k).reshape((len(z_H), len(y_R)))
@@ -115,6 +121,16 @@ def load_k_map(amount="total"):
     return df
 
 
+def load_rstress_map(turbine="turbine2", component="uu"):
+    """Load all resolved Reynolds stress profiles from `UPrime2Mean`. Returns a
+    `DataFrame` with `z_R` as the index and `y_R` as columns.
+    """
+    # Define columns in set raw data file
+    columns = dict(uu=0, uv=1, uw=2, vv=3, vw=4, ww=5)
+    return _load_sets_map(turbine, "UPrime2Mean",
+                          "UPrime2Mean_{}".format(columns[component]))
+
+
 def load_upup_profile(turbine="turbine2", z_R=0.0):
     """Load data from the sampled `UPrime2Mean` and `RMeanXX` and
     return it as a pandas `DataFrame`.
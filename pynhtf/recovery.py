@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+"""Wake recovery analysis from sampled mean velocity and Reynolds stresses.
+
+Terms of the mean kinetic energy (MKE) transport equation are computed on the
+sampled cross-stream planes. Since the samples lie in a single y-z plane, only
+the cross-stream (y and z) contributions to each term are available.
+"""
+
+from __future__ import division, print_function
+import numpy as np
+import pandas as pd
+from .processing import (load_vel_map, load_rstress_map, R, D, U_infty, nu)
+
+# Labels for the MKE transport terms
+labels = {"y_adv": r"$-V \partial K / \partial y$",
+          "z_adv": r"$-W \partial K / \partial z$",
+          "turb_trans": "Turb. trans.",
+          "turb_prod": "Turb. prod.",
+          "visc_diss": "Visc. diss."}
+
+
+def _trapz_weights(x):
+    """Trapezoidal rule integration weights for coordinates ``x``."""
+    dx = np.abs(np.diff(x))
+    w = np.zeros(len(x))
+    w[:-1] += dx/2
+    w[1:] += dx/2
+    return w
+
+
+def calc_mke_transport(turbine="turbine2"):
+    """Calculate MKE transport terms on the sampled plane behind ``turbine``.
+
+    Returns a dict of `DataFrame`s with `z_R` as the index and `y_R` as
+    columns, plus ``"K"`` for the mean kinetic energy itself. All gradients
+    are computed with second-order central differences. ``turb_prod`` is the
+    exchange with turbulence kinetic energy, i.e., the negative of TKE
+    production, so it is normally a sink.
+    """
+    u = load_vel_map(turbine=turbine, component="u")
+    y_R = np.asarray(u.columns.values, dtype=float)
+    z_R = np.asarray(u.index.values, dtype=float)
+    y = y_R*R[turbine]
+    z = z_R*R[turbine]
+    U = u.values
+    V = load_vel_map(turbine=turbine, component="v").values
+    W = load_vel_map(turbine=turbine, component="w").values
+    rs = {c: load_rstress_map(turbine=turbine, component=c).values
+          for c in ["uv", "uw", "vv", "vw", "ww"]}
+
+    def grad(f):
+        """Return (d/dy, d/dz) of ``f``."""
+        dfdz, dfdy = np.gradient(f, z, y)
+        return dfdy, dfdz
+
+    K = 0.5*(U**2 + V**2 + W**2)
+    dKdy, dKdz = grad(K)
+    dUdy, dUdz = grad(U)
+    dVdy, dVdz = grad(V)
+    dWdy, dWdz = grad(W)
+    terms = {}
+    terms["K"] = K
+    terms["y_adv"] = -V*dKdy
+    terms["z_adv"] = -W*dKdz
+    terms["turb_trans"] = (-grad(U*rs["uv"] + V*rs["vv"] + W*rs["vw"])[0]
+                           - grad(U*rs["uw"] + V*rs["vw"] + W*rs["ww"])[1])
+    terms["turb_prod"] = (rs["uv"]*dUdy + rs["uw"]*dUdz + rs["vv"]*dVdy
+                          + rs["vw"]*(dVdz + dWdy) + rs["ww"]*dWdz)
+    SijSij = (dVdy**2 + dWdz**2
+              + 2*((dUdy/2)**2 + (dUdz/2)**2 + ((dVdz + dWdy)/2)**2))
+    terms["visc_diss"] = -2*nu*SijSij
+    return {k: pd.DataFrame(v, index=z_R, columns=y_R)
+            for k, v in terms.items()}
+
+
+def calc_mke_budget(turbine="turbine2", normalize=True):
+    """Average the MKE transport terms over the rotor area of ``turbine``.
+
+    If ``normalize`` is ``True``, terms are nondimensionalized by
+    ``U_infty**3/D``. Returns a `Series` indexed by term name.
+    """
+    terms = calc_mke_transport(turbine=turbine)
+    K = terms.pop("K")
+    y_R = np.asarray(K.columns.values, dtype=float)
+    z_R = np.asarray(K.index.values, dtype=float)
+    yy, zz = np.meshgrid(y_R, z_R)
+    weights = np.outer(_trapz_weights(z_R), _trapz_weights(y_R))
+    weights *= np.sqrt(yy**2 + zz**2) <= 1.0
+    budget = pd.Series({k: (v.values*weights).sum()/weights.sum()
+                        for k, v in terms.items()})
+    if normalize:
+        budget *= D[turbine]/U_infty**3
+    return budget
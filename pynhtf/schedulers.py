@@ -0,0 +1,454 @@
+#!/usr/bin/env python
+"""Batch scheduler backends for running parameter sweeps.
+
+Each sweep point is run as a separate job in its own copy of the case, so
+points can run concurrently on a local process pool or be spread across a
+cluster as a SLURM job array.
+"""
+
+from __future__ import division, print_function
+import json
+import os
+import shlex
+import shutil
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# Files and directories copied into each job's work directory
+case_files = ["0.orig", "constant", "system", "pynhtf", "run.py"]
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class SweepPoint(object):
+    """A single point of a parameter sweep, with ``params`` the swept
+    parameter values.
+    """
+    def __init__(self, index, params, workdir):
+        self.index = index
+        self.params = params
+        self.workdir = workdir
+        self.attempts = 0
+        self.state = PENDING
+
+
+def prepare_workdir(workdir, case_dir="."):
+    """Copy the case files needed for a run into ``workdir``."""
+    if os.path.isdir(workdir):
+        shutil.rmtree(workdir)
+    os.makedirs(workdir)
+    for name in case_files:
+        src = os.path.join(case_dir, name)
+        dst = os.path.join(workdir, name)
+        if os.path.isdir(src):
+            shutil.copytree(src, dst, ignore=shutil.ignore_patterns(
+                "__pycache__", "*.pyc"))
+        elif os.path.isfile(src):
+            shutil.copy2(src, dst)
+
+
+def archive_logs(workdir, dest):
+    """Copy the solver and job logs from ``workdir`` into ``dest``."""
+    if not os.path.isdir(workdir):
+        return
+    fnames = [f for f in os.listdir(workdir)
+              if f.startswith("log.") or f == "slurm.out"]
+    if fnames and not os.path.isdir(dest):
+        os.makedirs(dest)
+    for fname in fnames:
+        shutil.copy2(os.path.join(workdir, fname), os.path.join(dest, fname))
+
+
+def job_command(params, log_param, parallel=True, resume=False):
+    """Create the ``run.py`` command line for a single sweep point."""
+    cmd = [sys.executable, "run.py"]
+    for k, v in params.items():
+        cmd += ["--" + k.replace("_", "-"), str(v)]
+    if not parallel:
+        cmd.append("--serial")
+    if resume:
+        cmd.append("--resume")
+    cmd += ["--log-results", log_param]
+    return cmd
+
+
+def _run_job(cmd, workdir):
+    """Run a job command in ``workdir``, returning its exit code."""
+    with open(os.path.join(workdir, "log.job"), "w") as f:
+        return subprocess.call(cmd, cwd=workdir, stdout=f,
+                               stderr=subprocess.STDOUT)
+
+
+class SweepExecutor(object):
+    """Interface for sweep executor backends.
+
+    Backends submit jobs without blocking and report job states through
+    ``poll``, which must also return immediately.
+    """
+    def submit(self, points, commands, ntasks=1):
+        """Submit one job per point. ``commands`` maps point index to a
+        command list.
+        """
+        raise NotImplementedError
+
+    def poll(self):
+        """Return a dict of point index to state for submitted jobs."""
+        raise NotImplementedError
+
+    def shutdown(self):
+        """Release any resources held by the backend."""
+        pass
+
+
+class LocalPoolExecutor(SweepExecutor):
+    """Run sweep points on a local process pool.
+
+    ``ntasks`` is ignored, since each job launches its own MPI processes.
+    """
+    def __init__(self, nworkers=1):
+        self.pool = ProcessPoolExecutor(max_workers=nworkers)
+        self.futures = {}
+
+    def submit(self, points, commands, ntasks=1):
+        for p in points:
+            self.futures[p.index] = self.pool.submit(_run_job,
+                                                     commands[p.index],
+                                                     p.workdir)
+
+    def poll(self):
+        states = {}
+        for index, fut in self.futures.items():
+            if not fut.done():
+                states[index] = RUNNING if fut.running() else PENDING
+            elif fut.exception() is None and fut.result() == 0:
+                states[index] = DONE
+            else:
+                states[index] = FAILED
+        return states
+
+    def shutdown(self):
+        self.pool.shutdown(wait=True)
+
+
+class SlurmCommands(object):
+    """Thin wrapper around the SLURM ``sbatch``, ``squeue`` and ``sacct``
+    commands.
+    """
+    def sbatch(self, script, array):
+        """Submit ``script`` as a job array, returning the job ID."""
+        out = subprocess.check_output(["sbatch", "--parsable",
+                                       "--array=" + array, script])
+        return out.decode().strip().split(";")[0]
+
+    def squeue(self, job_id):
+        """Return a dict of array index to state for queued tasks."""
+        out = subprocess.check_output(["squeue", "-h", "-r", "-j", job_id,
+                                       "-o", "%K %T"]).decode()
+        return _parse_states(out)
+
+    def sacct(self, job_id):
+        """Return a dict of array index to state for finished tasks."""
+        out = subprocess.check_output(["sacct", "-n", "-P", "-X", "-j",
+                                       job_id, "-o", "JobID,State"]).decode()
+        states = {}
+        for line in out.splitlines():
+            if not line.strip():
+                continue
+            jid, state = line.split("|")[:2]
+            if "_" in jid:
+                idx = jid.split("_")[-1]
+                if idx.isdigit():
+                    states[int(idx)] = state.split()[0]
+        return states
+
+
+def _parse_states(out):
+    states = {}
+    for line in out.splitlines():
+        if line.strip():
+            idx, state = line.split()[:2]
+            states[int(idx)] = state
+    return states
+
+
+class FakeSlurmCommands(SlurmCommands):
+    """Local stand-in for the SLURM commands, for testing without a
+    cluster. Array tasks are run as background processes with
+    ``SLURM_ARRAY_TASK_ID`` set and output written to the ``--output`` path,
+    at most ``N`` at a time if the array has a ``%N`` throttle. ``max_running`` records the most tasks run at once.
+    """
+    def __init__(self):
+        self.jobs = {}
+        self.njobs = 0
+        self.max_running = 0
+
+    def sbatch(self, script, array):
+        self.njobs += 1
+        job_id = str(self.njobs)
+        indices, _, limit = array.partition("%")
+        self.jobs[job_id] = {"script": script, "procs": {},
+                             "limit": int(limit) if limit else None,
+                             "pending": [int(i) for i in indices.split(",")]}
+        self._start(job_id)
+        return job_id
+
+    def _start(self, job_id):
+        """Start pending tasks of ``job_id`` up to its throttle."""
+        job = self.jobs[job_id]
+        running = [p for p in job["procs"].values() if p.poll() is None]
+        while job["pending"] and (job["limit"] is None
+                                  or len(running) < job["limit"]):
+            idx = job["pending"].pop(0)
+            env = dict(os.environ, SLURM_ARRAY_TASK_ID=str(idx),
+                       SLURM_ARRAY_JOB_ID=job_id)
+            with open(job["script"]) as f:
+                output = [line.split("=", 1)[1].strip().replace(
+                          "%a", str(idx)) for line in f
+                          if line.startswith("#SBATCH --output=")]
+            stdout = None
+            if output and os.path.isdir(os.path.dirname(output[0])):
+                stdout = open(output[0], "w")
+            job["procs"][idx] = subprocess.Popen(["sh", job["script"]],
+                                                 env=env, stdout=stdout,
+                                                 stderr=subprocess.STDOUT)
+            if stdout is not None:
+                stdout.close()
+            running.append(job["procs"][idx])
+        self.max_running = max(self.max_running, sum(
+            p.poll() is None for j in self.jobs.values()
+            for p in j["procs"].values()))
+
+    def squeue(self, job_id):
+        self._start(job_id)
+        job = self.jobs[job_id]
+        queued = {idx: "RUNNING" for idx, p in job["procs"].items()
+                  if p.poll() is None}
+        queued.update({idx: "PENDING" for idx in job["pending"]})
+        # Like SLURM, drop arrays whose tasks have all finished
+        if not queued:
+            raise subprocess.CalledProcessError(1, "squeue")
+        return queued
+
+    def sacct(self, job_id):
+        self._start(job_id)
+        job = self.jobs[job_id]
+        states = {idx: "PENDING" for idx in job["pending"]}
+        for idx, p in job["procs"].items():
+            code = p.poll()
+            if code is None:
+                states[idx] = "RUNNING"
+            else:
+                states[idx] = "COMPLETED" if code == 0 else "FAILED"
+        return states
+
+
+slurm_script_template = """#!/bin/sh
+#SBATCH --job-name={job_name}
+#SBATCH --ntasks={ntasks}
+#SBATCH --output={sweep_dir}/%a/slurm.out
+{extra}
+cd {sweep_dir}/$SLURM_ARRAY_TASK_ID || exit 1
+sh job.sh
+"""
+
+
+class SlurmExecutor(SweepExecutor):
+    """Run sweep points as a SLURM job array.
+
+    Each point's command is written to ``job.sh`` in its work directory and
+    the array task ID selects the directory. ``sbatch_args`` is a list of
+    extra ``#SBATCH`` options, e.g., ``["--time=24:00:00"]``, and
+    ``max_concurrent`` limits the number of array tasks running at once.
+    Tasks that have finished are not polled again unless resubmitted.
+    """
+    def __init__(self, sweep_dir, job_name="ntnu-hawt", sbatch_args=[],
+                 max_concurrent=None, commands=None):
+        self.sweep_dir = os.path.abspath(sweep_dir)
+        self.job_name = job_name
+        self.sbatch_args = sbatch_args
+        self.max_concurrent = max_concurrent
+        if commands is None:
+            commands = SlurmCommands()
+        self.commands = commands
+        self.jobs = {}
+        self.finished = {}
+        self.nsubmit = 0
+
+    def submit(self, points, commands, ntasks=1):
+        for p in points:
+            self.finished.pop(p.index, None)
+            with open(os.path.join(p.workdir, "job.sh"), "w") as f:
+                f.write(shlex.join(commands[p.index]) + "\n")
+        extra = "\n".join("#SBATCH " + a for a in self.sbatch_args)
+        script = os.path.join(self.sweep_dir,
+                              "submit.{}.sh".format(self.nsubmit))
+        self.nsubmit += 1
+        with open(script, "w") as f:
+            f.write(slurm_script_template.format(job_name=self.job_name,
+                                                 ntasks=ntasks,
+                                                 sweep_dir=self.sweep_dir,
+                                                 extra=extra))
+        array = ",".join(str(p.index) for p in points)
+        if self.max_concurrent:
+            array += "%{}".format(self.max_concurrent)
+        job_id = self.commands.sbatch(script, array)
+        for p in points:
+            self.jobs[p.index] = job_id
+
+    def poll(self):
+        states = dict(self.finished)
+        active = {i: j for i, j in self.jobs.items()
+                  if i not in self.finished}
+        for job_id in set(active.values()):
+            indices = [i for i, j in active.items() if j == job_id]
+            try:
+                queued = self.commands.squeue(job_id)
+            except subprocess.CalledProcessError:
+                # Finished arrays are dropped from the queue after MinJobAge
+                queued = {}
+            finished = {}
+            if any(i not in queued for i in indices):
+                finished = self.commands.sacct(job_id)
+            for i in indices:
+                state = queued.get(i, finished.get(i, "PENDING"))
+                if state == "COMPLETED":
+                    states[i] = DONE
+                elif state in ("PENDING", "CONFIGURING", "REQUEUED"):
+                    states[i] = PENDING
+                elif state in ("RUNNING", "COMPLETING"):
+                    states[i] = RUNNING
+                else:
+                    states[i] = FAILED
+                if states[i] in (DONE, FAILED):
+                    self.finished[i] = states[i]
+        return states
+
+
+def collect_results(points, name, case_dir=".", append=False):
+    """Collect per-point results, timing records and logs into the case's
+    ``processed`` directory. Logs of every point, including failed ones, are
+    copied to ``processed/{name}_logs/{index}``.
+    """
+    import pandas as pd
+    from pynhtf import costs
+    processed = os.path.join(case_dir, "processed")
+    fpath = os.path.join(processed, "{}_sweep.csv".format(name))
+    dfs = []
+    if append and os.path.isfile(fpath):
+        dfs.append(pd.read_csv(fpath))
+    for p in points:
+        costs.append_timings(
+            costs.load_timings(os.path.join(p.workdir, costs.timings_fpath)),
+            fpath=os.path.join(case_dir, costs.timings_fpath))
+        archive_logs(p.workdir, os.path.join(processed, name + "_logs",
+                                             str(p.index)))
+        fpath_p = os.path.join(p.workdir, "processed",
+                               "{}_sweep.csv".format(name))
+        if p.state != DONE or not os.path.isfile(fpath_p):
+            continue
+        df = pd.read_csv(fpath_p)
+        for k, v in p.params.items():
+            df[k] = v
+        dfs.append(df)
+    if not dfs:
+        return
+    pd.concat(dfs, ignore_index=True).to_csv(fpath, index=False)
+
+
+def load_points(sweep_dir):
+    """Load the points saved by `run_sweep` in ``sweep_dir``, or return
+    ``None`` if there are none.
+    """
+    fpath = os.path.join(sweep_dir, "points.json")
+    if not os.path.isfile(fpath):
+        return None
+    with open(fpath) as f:
+        return json.load(f)
+
+
+def run_sweep(executor, points, name, case_dir=".", sweep_dir=None,
+              ntasks=1, parallel=True, append=False, max_retries=1,
+              poll_interval=30, order=None, resume=False, verbose=True,
+              **kwargs):
+    """Run sweep ``name`` through ``executor``, one job per dict of
+    parameter values in ``points``, with ``kwargs`` as defaults.
+
+    ``order`` is an optional list of point indices to submit them in, e.g.,
+    longest predicted run first. Failed points are resubmitted up to
+    ``max_retries`` times, after archiving their logs. With ``resume``, the
+    points saved in ``sweep_dir`` are used, points whose work directory has
+    results are not rerun, and the rest are resumed in place; the jobs of
+    the interrupted sweep must no longer be running. Returns the list of
+    `SweepPoint` objects.
+    """
+    if sweep_dir is None:
+        sweep_dir = os.path.join(case_dir, "sweeps", name)
+    log_dir = os.path.join(case_dir, "processed", name + "_logs")
+    saved = load_points(sweep_dir) if resume else None
+    if saved is not None:
+        points = saved
+    elif resume:
+        print("No {} sweep to resume; starting from scratch".format(name))
+        resume = False
+    if not resume:
+        if not os.path.isdir(sweep_dir):
+            os.makedirs(sweep_dir)
+        with open(os.path.join(sweep_dir, "points.json"), "w") as f:
+            json.dump(points, f, indent=4)
+    sweep_points = []
+    commands = {}
+    for i, params in enumerate(points):
+        p = SweepPoint(i, params, os.path.join(sweep_dir, str(i)))
+        done = os.path.isfile(os.path.join(p.workdir, "processed",
+                                           "{}_sweep.csv".format(name)))
+        if resume and done:
+            p.state = DONE
+        elif not (resume and os.path.isdir(p.workdir)):
+            prepare_workdir(p.workdir, case_dir=case_dir)
+        commands[i] = job_command(dict(kwargs, **params), log_param=name,
+                                  parallel=parallel,
+                                  resume=resume and not done)
+        sweep_points.append(p)
+    points = sweep_points
+    submit = [p for p in points if p.state != DONE]
+    if order is not None:
+        submit = [points[i] for i in order if points[i].state != DONE]
+    if verbose:
+        print("Submitting {} of {} {} sweep points".format(
+              len(submit), len(points), name))
+    for p in submit:
+        p.attempts = 1
+    if submit:
+        executor.submit(submit, commands, ntasks=ntasks)
+    try:
+        while True:
+            states = executor.poll()
+            retry = []
+            for p in points:
+                state = states.get(p.index, p.state)
+                if state != p.state and verbose:
+                    print("Point {} {}: {}".format(p.index, p.params, state))
+                p.state = state
+                if state == FAILED and p.attempts <= max_retries:
+                    archive_logs(p.workdir, os.path.join(
+                        log_dir, str(p.index), "attempt{}".format(p.attempts)))
+                    prepare_workdir(p.workdir, case_dir=case_dir)
+                    p.attempts += 1
+                    p.state = PENDING
+                    retry.append(p)
+            if retry:
+                if verbose:
+                    print("Retrying {} failed points".format(len(retry)))
+                executor.submit(retry, commands, ntasks=ntasks)
+            elif all(p.state in (DONE, FAILED) for p in points):
+                break
+            time.sleep(poll_interval)
+    finally:
+        executor.shutdown()
+    collect_results(points, name, case_dir=case_dir, append=append)
+    return points
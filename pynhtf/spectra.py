@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+"""Streaming spectral analysis of probe time series."""
+
+from __future__ import division, print_function
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+from .processing import R, U_infty
+
+probes_fpath = "postProcessing/probes/0/U"
+components = dict(u=0, v=1, w=2)
+
+
+def rotor_freq(tsr=6.0, turbine="turbine1", U_infty=U_infty):
+    """Calculate rotor frequency in Hz from tip speed ratio."""
+    return tsr*U_infty/(2*np.pi*R[turbine])
+
+
+def read_probe_chunks(fpath=probes_fpath, component="u", chunksize=100000):
+    """Read a vector probes file in chunks of ``chunksize`` lines.
+
+    ``component`` can be ``"u"``, ``"v"``, ``"w"`` or ``"mag"``. Yields tuples
+    of time (1-D) and data arrays, the latter with one column per probe.
+    Samples that do not advance in time (e.g., repeated after a restart) are
+    skipped so the series is uniformly spaced.
+    """
+    t_last = -np.inf
+    lines = []
+
+    def parse(lines):
+        data = np.loadtxt(lines, ndmin=2)
+        t = data[:, 0]
+        vel = data[:, 1:].reshape((len(t), -1, 3))
+        if component == "mag":
+            vel = np.sqrt((vel**2).sum(axis=2))
+        else:
+            vel = vel[:, :, components[component]]
+        return t, vel
+
+    with open(fpath) as f:
+        for line in f:
+            if line.startswith("#") or not line.strip():
+                continue
+            lines.append(line.replace("(", " ").replace(")", " "))
+            if len(lines) >= chunksize:
+                t, vel = parse(lines)
+                lines = []
+                keep = t > np.maximum.accumulate(np.append(t_last, t))[:-1]
+                t_last = max(t_last, t.max())
+                yield t[keep], vel[keep]
+    if lines:
+        t, vel = parse(lines)
+        keep = t > np.maximum.accumulate(np.append(t_last, t))[:-1]
+        yield t[keep], vel[keep]
+
+
+class _WelchAccumulator(object):
+    """Accumulate averaged periodograms segment by segment.
+
+    Samples are buffered only until a full segment is available, so memory
+    use is bounded by ``nperseg`` and the incoming chunk size.
+    """
+    def __init__(self, nchannels, nperseg=4096, noverlap=None, pairs=(),
+                 nthreads=None):
+        if noverlap is None:
+            noverlap = nperseg//2
+        if not 0 <= noverlap < nperseg:
+            raise ValueError("noverlap must be less than nperseg")
+        self.nperseg = nperseg
+        self.step = nperseg - noverlap
+        self.pairs = list(pairs)
+        n = np.arange(nperseg)
+        self.window = 0.5 - 0.5*np.cos(2*np.pi*n/nperseg)
+        self.buffer = np.zeros((0, nchannels))
+        self.nfreq = nperseg//2 + 1
+        self.auto = np.zeros((nchannels, self.nfreq))
+        self.cross = np.zeros((len(self.pairs), self.nfreq), dtype=complex)
+        self.nseg = 0
+        self.nthreads = nthreads
+
+    def _fft(self, segs):
+        """FFT detrended, windowed segments of shape (nseg, nperseg)."""
+        segs = segs - segs.mean(axis=1, keepdims=True)
+        return np.fft.rfft(segs*self.window, axis=1)
+
+    def update(self, data):
+        """Add samples (rows) for all channels (columns)."""
+        buf = np.concatenate((self.buffer, data))
+        nseg = (len(buf) - self.nperseg)//self.step + 1 \
+            if len(buf) >= self.nperseg else 0
+        if nseg > 0:
+            idx = (np.arange(nseg)[:, None]*self.step
+                   + np.arange(self.nperseg)[None, :])
+            channels = [buf[idx, i] for i in range(buf.shape[1])]
+            if self.nthreads == 1 or len(channels) == 1:
+                specs = [self._fft(c) for c in channels]
+            else:
+                with ThreadPoolExecutor(max_workers=self.nthreads) as pool:
+                    specs = list(pool.map(self._fft, channels))
+            for i, s in enumerate(specs):
+                self.auto[i] += (np.abs(s)**2).sum(axis=0)
+            for n, (i, j) in enumerate(self.pairs):
+                self.cross[n] += (np.conj(specs[i])*specs[j]).sum(axis=0)
+            self.nseg += nseg
+        self.buffer = buf[nseg*self.step:]
+
+    def result(self, fs):
+        """Return frequencies, one-sided PSDs and cross-spectral densities."""
+        if self.nseg == 0:
+            raise ValueError("Time series shorter than nperseg")
+        scale = np.ones(self.nfreq)/(fs*(self.window**2).sum()*self.nseg)
+        scale[1:] *= 2
+        if self.nperseg % 2 == 0:
+            scale[-1] /= 2
+        f = np.fft.rfftfreq(self.nperseg, d=1/fs)
+        return f, self.auto*scale, self.cross*scale
+
+
+def calc_probe_spectra(fpath=probes_fpath, component="u", nperseg=4096,
+                       noverlap=None, pairs="all", tsr=None,
+                       turbine="turbine1", t1=0.0, chunksize=100000,
+                       nthreads=None):
+    """Calculate Welch PSDs, cross-spectra and coherence for velocity probes.
+
+    The probes file is streamed in chunks of ``chunksize`` lines. ``pairs``
+    is a list of probe index tuples for cross-spectra and coherence, or
+    ``"all"`` for every pair. If ``tsr`` is supplied, frequencies are also
+    normalized by the rotor frequency of ``turbine``. Samples before ``t1``
+    are discarded. Returns a `DataFrame` indexed by frequency.
+    """
+    acc = None
+    t_prev = None
+    fs = None
+    for t, vel in read_probe_chunks(fpath, component=component,
+                                    chunksize=chunksize):
+        vel = vel[t >= t1]
+        t = t[t >= t1]
+        if len(t) == 0:
+            continue
+        if acc is None:
+            nprobes = vel.shape[1]
+            if pairs == "all":
+                pairs = list(itertools.combinations(range(nprobes), 2))
+            acc = _WelchAccumulator(nprobes, nperseg=nperseg,
+                                    noverlap=noverlap, pairs=pairs,
+                                    nthreads=nthreads)
+        if fs is None:
+            if len(t) > 1:
+                fs = 1/(t[1] - t[0])
+            elif t_prev is not None:
+                fs = 1/(t[0] - t_prev)
+        t_prev = t[-1]
+        acc.update(vel)
+    if acc is None or fs is None:
+        raise ValueError("No probe data found in {}".format(fpath))
+    f, psd, csd = acc.result(fs)
+    df = pd.DataFrame(index=pd.Index(f, name="f"))
+    if tsr is not None:
+        df["f_f_rot"] = f/rotor_freq(tsr=tsr, turbine=turbine)
+    for i, p in enumerate(psd):
+        df["psd_{}".format(i)] = p
+    for n, (i, j) in enumerate(acc.pairs):
+        df["csd_{}_{}".format(i, j)] = csd[n]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            df["coh_{}_{}".format(i, j)] = np.abs(csd[n])**2/(psd[i]*psd[j])
+    return df
+
+
+def calc_psd(fpath=probes_fpath, component="u", probe=0, **kwargs):
+    """Calculate the Welch PSD for a single probe. Returns a `DataFrame` with
+    columns ``f``, ``psd`` and, if ``tsr`` is supplied, ``f_f_rot``.
+    """
+    df = calc_probe_spectra(fpath, component=component, pairs=[], **kwargs)
+    cols = [c for c in ["f_f_rot"] if c in df]
+    df = df[cols + ["psd_{}".format(probe)]]
+    df = df.rename(columns={"psd_{}".format(probe): "psd"})
+    return df.reset_index()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+"""Multi-dimensional parameter sweep planning.
+
+Sweep points are ordered by the most expensive pipeline stage their
+parameters invalidate, so meshing and ``topoSet`` are rerun as few times as
+possible over a campaign.
+"""
+
+from __future__ import division, print_function
+import itertools
+import numpy as np
+
+# Pipeline stages, from most to least expensive
+stage_order = ["mesh", "topoSet", "sources"]
+
+# The earliest pipeline stage invalidated by changing each parameter
+param_stages = {"nx": "mesh",
+                "turbine1_x": "topoSet",
+                "turbine2_x": "topoSet",
+                "turbine1_tsr": "sources",
+                "turbine2_tsr": "sources",
+                "turbine1_yaw": "sources",
+                "turbine2_yaw": "sources",
+                "dt": "sources"}
+
+int_params = ["nx"]
+
+
+def check_params(params):
+    """Raise a `ValueError` for parameters that cannot be swept."""
+    for p in params:
+        if p not in param_stages:
+            raise ValueError("Cannot sweep {}; choose from {}".format(
+                p, sorted(param_stages)))
+
+
+def _cast(param, value):
+    if param in int_params:
+        return int(round(value))
+    return float(value)
+
+
+def parse_values(txt, param=None):
+    """Parse a comma-separated list of values, or a ``start:stop:step`` range
+    where ``stop`` is not included.
+    """
+    if ":" in txt:
+        start, stop, step = (float(v) for v in txt.split(":"))
+        # Count steps with a tolerance so rounding error can't add ``stop``
+        n = max(int(np.ceil((stop - start)/step - 1e-9)), 0)
+        values = np.round(start + step*np.arange(n), 12)
+    else:
+        values = [float(v) for v in txt.split(",")]
+    return [_cast(param, v) for v in values]
+
+
+def grid_points(**values):
+    """Create the full-factorial grid of the supplied parameter values."""
+    check_params(values)
+    names = list(values)
+    return [dict(zip(names, [_cast(n, v) for n, v in zip(names, combo)]))
+            for combo in itertools.product(*values.values())]
+
+
+def lhs_points(n, seed=None, **bounds):
+    """Create ``n`` Latin hypercube samples within ``(low, high)`` bounds for
+    each parameter.
+    """
+    check_params(bounds)
+    rng = np.random.RandomState(seed)
+    samples = {}
+    for name, (low, high) in bounds.items():
+        strata = (rng.permutation(n) + rng.uniform(size=n))/n
+        samples[name] = low + strata*(high - low)
+    return [{name: _cast(name, samples[name][i]) for name in bounds}
+            for i in range(n)]
+
+
+def list_points(fpath):
+    """Read user-specified sweep points from a CSV file with one column per
+    parameter.
+    """
+    import pandas as pd
+    df = pd.read_csv(fpath, skipinitialspace=True)
+    check_params(df.columns)
+    return [{k: _cast(k, v) for k, v in row.items()}
+            for row in df.to_dict(orient="records")]
+
+
+def order_points(points):
+    """Sort points so parameters invalidating earlier stages change least
+    often.
+    """
+    names = sorted({k for p in points for k in p},
+                   key=lambda k: (stage_order.index(param_stages[k]), k))
+    return sorted(points, key=lambda p: tuple(p.get(k, np.nan)
+                                              for k in names))
+
+
+def point_label(index, point):
+    """Label a sweep point by its value if it has a single parameter, or by
+    its index otherwise.
+    """
+    if len(point) == 1:
+        return str(list(point.values())[0])
+    return str(index)
+
+
+def plan_stages(points, order=True):
+    """Return a list of ``(point, stage)`` tuples, where ``stage`` is the
+    earliest pipeline stage that must be rerun for that point.
+    """
+    if order:
+        points = order_points(points)
+    plan = []
+    prev = None
+    for p in points:
+        if prev is None:
+            stage = stage_order[0]
+        else:
+            changed = [param_stages[k] for k in p if p[k] != prev.get(k)]
+            changed.append(stage_order[-1])
+            stage = min(changed, key=stage_order.index)
+        plan.append((p, stage))
+        prev = p
+    return plan
@@ -1,17 +1,21 @@
 #!/usr/bin/env python
-"""Script for running the NTNU HAWT case."""
+"""Script for running the NTNU HAWT case.
+
+foamPy, NumPy, pandas and ``pynhtf.processing`` are imported inside the
+functions that use them so that case setup and ``--help`` start quickly.
+"""
 
 import argparse
+import gzip
+import json
+import math
 import os
+import re
 import subprocess
-from subprocess import call, check_output
-import numpy as np
-import pandas as pd
+from subprocess import check_output
 import glob
-import foampy
-from foampy.dictionaries import replace_value
 import shutil
-from pynhtf import processing as pr
+from pynhtf.costs import read_dict_value
 
 
 def get_mesh_dims():
@@ -24,12 +28,131 @@ def get_mesh_dims():
 
 def get_dt():
     """Read ``deltaT`` from ``controlDict``."""
-    return foampy.dictionaries.read_single_line_value("controlDict",
-                                                      keyword="deltaT")
+    return float(read_dict_value("system/controlDict", "deltaT"))
+
+
+def get_time_dirs(case_dir="."):
+    """List time directory names in ``case_dir``, sorted by time."""
+    times = []
+    for d in os.listdir(case_dir):
+        try:
+            t = float(d)
+        except ValueError:
+            continue
+        if os.path.isdir(os.path.join(case_dir, d)):
+            times.append((t, d))
+    return [d for t, d in sorted(times)]
+
+
+def check_time_dir(path, fields=["U", "p"]):
+    """Check that a time directory contains ``fields`` and that all field
+    files were completely written, i.e., end with the OpenFOAM footer.
+    """
+    for field in fields:
+        if not (os.path.isfile(os.path.join(path, field))
+                or os.path.isfile(os.path.join(path, field + ".gz"))):
+            return False
+    for fname in os.listdir(path):
+        fpath = os.path.join(path, fname)
+        if not os.path.isfile(fpath):
+            continue
+        try:
+            if fname.endswith(".gz"):
+                tail = b""
+                with gzip.open(fpath) as f:
+                    for chunk in iter(lambda: f.read(2**20), b""):
+                        tail = (tail + chunk)[-200:]
+            else:
+                with open(fpath, "rb") as f:
+                    f.seek(max(os.path.getsize(fpath) - 200, 0))
+                    tail = f.read()
+        except (OSError, EOFError):
+            return False
+        if b"// ****" not in tail:
+            return False
+    return True
+
+
+def find_latest_time(parallel=False):
+    """Find the latest intact time directory after t = 0.
+
+    If ``parallel``, the time must be intact in all processor directories.
+    Returns ``None`` if there is nothing to restart from.
+    """
+    if parallel:
+        case_dirs = sorted(glob.glob("processor*"))
+        if not case_dirs:
+            return None
+    else:
+        case_dirs = ["."]
+    times = set(get_time_dirs(case_dirs[0]))
+    for d in case_dirs[1:]:
+        times &= set(get_time_dirs(d))
+    for t in sorted(times, key=float, reverse=True):
+        if float(t) <= 0:
+            break
+        if all(check_time_dir(os.path.join(d, t)) for d in case_dirs):
+            return t
+        print("Skipping incomplete time directory {}".format(t))
+    return None
+
+
+def clean_case(leave_mesh=False, remove_zero=True):
+    """Clean the case with ``foampy.clean``, which only cleans the case root,
+    then remove time directories after t = 0 from the processor directories.
+    If the mesh is not left, the processor directories are removed entirely
+    so the case is decomposed again.
+    """
+    import foampy
+    foampy.clean(leave_mesh=leave_mesh, remove_zero=remove_zero)
+    for d in glob.glob("*.incomplete"):
+        shutil.rmtree(d)
+    for d in glob.glob("processor*"):
+        if not leave_mesh:
+            shutil.rmtree(d)
+            continue
+        for t in get_time_dirs(d):
+            if float(t) > 0:
+                shutil.rmtree(os.path.join(d, t))
+        for t in glob.glob(os.path.join(d, "*.incomplete")):
+            shutil.rmtree(t)
+
+
+def get_nprocs():
+    """Read ``numberOfSubdomains`` from ``decomposeParDict``."""
+    return int(read_dict_value("system/decomposeParDict",
+                               "numberOfSubdomains"))
+
+
+def get_executor(scheduler="local", nworkers=1, sweep_dir=None,
+                 time_limit=None, max_concurrent=None):
+    """Create a sweep executor for the ``scheduler`` backend.
+
+    ``time_limit`` is the SLURM job time limit in seconds and
+    ``max_concurrent`` the maximum number of SLURM array tasks running at
+    once.
+    """
+    from pynhtf import schedulers
+    sbatch_args = []
+    if time_limit is not None:
+        h, m = divmod(int(math.ceil(time_limit/60)), 60)
+        sbatch_args.append("--time={}:{:02d}:00".format(h, m))
+    if scheduler == "local":
+        return schedulers.LocalPoolExecutor(nworkers=nworkers)
+    elif scheduler == "slurm":
+        return schedulers.SlurmExecutor(sweep_dir, sbatch_args=sbatch_args,
+                                        max_concurrent=max_concurrent)
+    elif scheduler == "fake-slurm":
+        return schedulers.SlurmExecutor(
+            sweep_dir, sbatch_args=sbatch_args, max_concurrent=max_concurrent,
+            commands=schedulers.FakeSlurmCommands())
+    else:
+        raise ValueError("Unknown scheduler: {}".format(scheduler))
 
 
 def get_nacelle_ano_vals():
     """Lookup sampled nacelle anemometer values."""
+    from pynhtf import processing as pr
     res = {}
     df = pr.load_nacelle_sets()
     for idx, row in df.iterrows():
@@ -38,8 +161,14 @@ def get_nacelle_ano_vals():
     return res
 
 
-def log_results(param="turbine1_yaw", append=True, verbose=True):
-    """Log results to CSV file."""
+def log_results(param="turbine1_yaw", append=True, verbose=True, params=None):
+    """Log results to CSV file.
+
+    ``params`` is an optional dict of swept parameter values to log with the
+    results.
+    """
+    import pandas as pd
+    from pynhtf import processing as pr
     if not os.path.isdir("processed"):
         os.mkdir("processed")
     fpath = "processed/{}_sweep.csv".format(param)
@@ -48,10 +177,11 @@ def log_results(param="turbine1_yaw", append=True, verbose=True):
     else:
         df = pd.DataFrame()
     d = pr.calc_perf()
+    if params is not None:
+        d.update(params)
     d.update(get_mesh_dims())
     d["dt"] = get_dt()
-    d["yaw"] = foampy.read_single_line_value(dictpath="system/fvOptions",
-                                             keyword="yawAngle")
+    d["yaw"] = float(read_dict_value("system/fvOptions", "yawAngle"))
     # Add nacelle anemometer params and results
     d.update(get_nacelle_ano_vals())
     if verbose:
@@ -62,46 +192,68 @@ def log_results(param="turbine1_yaw", append=True, verbose=True):
     df.to_csv(fpath, index=False)
 
 
-def set_blockmesh_resolution(nx=48, ny=None, nz=None):
-    """Set mesh resolution in ``blockMeshDict``.
-
-    If only ``nx`` is provided, the default resolutions for other dimensions are
-    scaled proportionally.
+def get_blockmesh_resolution(nx=None, ny=None, nz=None, base=None):
+    """Get mesh resolution, scaling the resolutions of ``base`` (by default
+    the current ``blockMeshDict``) for other dimensions proportionally if
+    only ``nx`` is provided.
     """
-    defaults = {"nx": 48, "ny": 48, "nz": 32}
+    if base is None:
+        base = get_mesh_dims()
+    if nx is None:
+        nx = base["nx"]
     if ny is None:
-        ny = nx
+        ny = int(round(nx*base["ny"]/base["nx"]))
     if nz is None:
-        nz = int(nx*defaults["nz"]/defaults["nx"])
+        nz = int(round(nx*base["nz"]/base["nx"]))
+    return {"nx": nx, "ny": ny, "nz": nz}
+
+
+def set_blockmesh_resolution(nx=None, ny=None, nz=None, base=None):
+    """Set mesh resolution in ``blockMeshDict``.
+
+    If only ``nx`` is provided, the resolutions of ``base`` (by default the
+    current ``blockMeshDict``) for other dimensions are scaled proportionally.
+    """
+    res = get_blockmesh_resolution(nx, ny, nz, base=base)
+    nx, ny, nz = res["nx"], res["ny"], res["nz"]
     print("Setting blockMesh resolution to ({} {} {})".format(nx, ny, nz))
-    foampy.fill_template("system/blockMeshDict.template", nx=nx, ny=ny, nz=nz)
+    fpath = "system/blockMeshDict"
+    with open(fpath) as f:
+        txt = f.read()
+    txt, n = re.subn(r"(hex\s*\([\d\s]+\)\s*)\(\s*\d+\s+\d+\s+\d+\s*\)",
+                     r"\g<1>({} {} {})".format(nx, ny, nz), txt, count=1)
+    if not n:
+        raise ValueError("No hex block found in {}".format(fpath))
+    with open(fpath, "w") as f:
+        f.write(txt)
 
 
 def set_dt(dt=0.01, tsr=None, tsr_0=6.0, write_interval=None, les=False):
     """Set ``deltaT`` in ``controlDict``. Will scale proportionally if ``tsr``
     and ``tsr_0`` are supplied, such that steps-per-rev is consistent with
-    ``tsr_0``.
+    ``tsr_0``. ``writeInterval`` is left unchanged unless ``write_interval``
+    is supplied or ``les`` is ``True``.
     """
     if tsr is not None:
         dt = dt*tsr_0/tsr
         print("Setting deltaT = dt*tsr_0/tsr = {:.3f}".format(dt))
-    dt = str(dt)
-    if write_interval is None:
-        if les:
-            write_interval = 0.01
-        else:
-            write_interval = 0.05
-    foampy.fill_template("system/controlDict.template", dt=dt,
-                         write_interval=write_interval)
+    from foampy.dictionaries import replace_value
+    if write_interval is None and les:
+        write_interval = 0.01
+    replace_value("system/controlDict", "deltaT", dt)
+    if write_interval is not None:
+        replace_value("system/controlDict", "writeInterval", write_interval)
 
 
 def gen_sets_file(origin=(0.1, 0.0, 0.04), step=0.01, yaw=None):
     """Generate ``sets`` file for post-processing nacelle anemometer
     locations.
     """
+    import numpy as np
+    from pynhtf import processing as pr
+    import foampy
     if yaw is None:
-        yaw = foampy.read_single_line_value(dictpath="system/fvOptions",
-                                            keyword="yawAngle")
+        yaw = float(read_dict_value("system/fvOptions", "yawAngle"))
     points_txt = ""
     points = [list(origin)]
     for s in [-step, step]:
@@ -120,12 +272,10 @@ def gen_sets_file(origin=(0.1, 0.0, 0.04), step=0.01, yaw=None):
 
 def post_process(parallel=False, tee=False, reconstruct=False, overwrite=True):
     """Execute all post-processing."""
+    import foampy
     gen_sets_file()
     foampy.run("postProcess", args="-func -vorticity", parallel=parallel,
                logname="log.vorticity", tee=tee, overwrite=overwrite)
-    foampy.run("postProcess", args="-dict system/controlDict.recovery "
-               " -latestTime", parallel=parallel, logname="log.recovery",
-               tee=tee, overwrite=overwrite)
     # Reconstruct if necessary so sampling isn't run in parallel
     if reconstruct:
         foampy.run("reconstructPar", args="-latestTime", overwrite=overwrite,
@@ -135,33 +285,266 @@ def post_process(parallel=False, tee=False, reconstruct=False, overwrite=True):
                tee=tee)
 
 
+def load_sweep_state(name):
+    """Load the checkpointed state of sweep ``name`` if it exists."""
+    fpath = "processed/{}_sweep.state.json".format(name)
+    if not os.path.isfile(fpath):
+        return None
+    with open(fpath) as f:
+        state = json.load(f)
+    print("Resuming {} sweep with {} of {} points done".format(
+          name, len(state["done"]), len(state["points"])))
+    return state
+
+
+def save_sweep_state(name, state):
+    """Checkpoint the state of sweep ``name``."""
+    if not os.path.isdir("processed"):
+        os.mkdir("processed")
+    fpath = "processed/{}_sweep.state.json".format(name)
+    with open(fpath + ".tmp", "w") as f:
+        json.dump(state, f, indent=4)
+    os.replace(fpath + ".tmp", fpath)
+
+
+def remove_sweep_state(name):
+    """Remove checkpointed state once sweep ``name`` has finished."""
+    fpath = "processed/{}_sweep.state.json".format(name)
+    if os.path.isfile(fpath):
+        os.remove(fpath)
+
+
 def param_sweep(param="turbine1_yaw", start=-20, stop=21, step=5,
-                dtype=float, append=False, parallel=True, tee=False, **kwargs):
-    """Run multiple simulations, varying ``param``.
+                dtype=float, append=False, parallel=True, tee=False,
+                scheduler=None, nworkers=None, max_retries=1, resume=False,
+                cores_per_node=None, max_walltime=None, time_limit=None,
+                **kwargs):
+    """Run multiple simulations, varying ``param``. ``stop`` is not included.
 
-    ``stop`` is not included.
+    The points are run by `multi_sweep`, which ``kwargs`` are passed to.
     """
-    print("Running {} sweep".format(param))
-    fpath = "processed/{}_sweep.csv".format(param)
-    if not append and os.path.isfile(fpath):
-        os.remove(fpath)
+    import numpy as np
     if param == "nx":
         dtype = int
-    param_list = np.arange(start, stop, step, dtype=dtype)
-    for p in param_list:
-        print("Running with {} = {}".format(param, p))
-        if p == param_list[0] or param == "nx":
-            foampy.clean(remove_zero=True)
-            mesh = True
+    param_list = np.arange(start, stop, step, dtype=dtype).tolist()
+    multi_sweep([{param: p} for p in param_list], name=param, append=append,
+                parallel=parallel, tee=tee, resume=resume, order=False,
+                scheduler=scheduler, nworkers=nworkers,
+                max_retries=max_retries, cores_per_node=cores_per_node,
+                max_walltime=max_walltime, time_limit=time_limit, **kwargs)
+
+
+def scheduled_sweep(points, name="grid", scheduler="local", append=False,
+                    parallel=True, resume=False, nworkers=None, max_retries=1,
+                    cores_per_node=None, max_walltime=None, time_limit=None,
+                    **kwargs):
+    """Run each of a list of parameter dicts as a separate job under
+    ``sweeps/{name}`` with the ``scheduler`` backend. With ``resume``,
+    finished points are kept and interrupted ones resumed in place.
+
+    Points are submitted longest predicted run first. ``cores_per_node``
+    defaults to the CPU count for the local scheduler, which sets the default
+    number of workers. With ``max_walltime``, runs are packed back to back
+    onto node slots and SLURM array concurrency is limited to the number of
+    packed slots.
+    """
+    from pynhtf.schedulers import run_sweep, load_points
+    from pynhtf.costs import pack_points
+    sweep_dir = os.path.join("sweeps", name)
+    saved = load_points(sweep_dir) if resume else None
+    if saved is not None:
+        points = saved
+    print("Running {} sweep with {} points".format(name, len(points)))
+    fpath = "processed/{}_sweep.csv".format(name)
+    if not append and not resume and os.path.isfile(fpath):
+        os.remove(fpath)
+    if cores_per_node is None:
+        cores_per_node = os.cpu_count() if scheduler == "local" else 32
+    nprocs = get_nprocs() if parallel else 1
+    ests = estimate(points, nprocs=nprocs, verbose=False, **kwargs)
+    wall_times = [e["wall_time"] for e in ests]
+    nodes = pack_points(wall_times, nprocs=nprocs,
+                        cores_per_node=cores_per_node,
+                        max_walltime=max_walltime)
+    nslots = len(nodes[0])
+    if nworkers is None:
+        nworkers = min(nslots, len(wall_times))
+    max_concurrent = None
+    if max_walltime is not None:
+        # Slots run their packed points back to back
+        max_concurrent = len(nodes)*nslots
+    if time_limit is None and ests[0]["fitted"]:
+        # Request 1.5 times the longest predicted wall time
+        time_limit = 1.5*max(wall_times)
+    elif time_limit is None:
+        print("Cost model not fit to past timings; not setting a job "
+              "time limit")
+    executor = get_executor(scheduler, nworkers=nworkers,
+                            sweep_dir=sweep_dir, time_limit=time_limit,
+                            max_concurrent=max_concurrent)
+    order = sorted(range(len(wall_times)), key=lambda i: -wall_times[i])
+    run_sweep(executor, points, name, sweep_dir=sweep_dir, ntasks=nprocs,
+              parallel=parallel, append=append, max_retries=max_retries,
+              order=order, resume=resume, **kwargs)
+
+
+def estimate(points=None, nprocs=None, cores_per_node=32, max_walltime=None,
+             disk_quota=None, verbose=True, **kwargs):
+    """Estimate wall time, core-hours and disk usage for a run or sweep.
+
+    ``points`` is a list of parameter dicts, which may override ``nx``,
+    ``dt`` and ``turbine*_active``; the current case settings are estimated
+    if omitted. ``kwargs`` supply defaults for the turbine parameters. The
+    cost model is fit to ``processed/timings.csv`` when enough past runs
+    have been recorded. Runs are packed onto nodes with ``cores_per_node``
+    cores and ``max_walltime`` seconds per node, and a warning is printed if
+    output would exceed ``disk_quota`` bytes. Returns a list of estimates,
+    with ``fitted`` set if the cost model was fit to timing records.
+    """
+    from pynhtf import costs
+    if points is None:
+        points = [{}]
+    if nprocs is None:
+        nprocs = get_nprocs()
+    control = "system/controlDict"
+    end_time = float(costs.read_dict_value(control, "endTime"))
+    write_interval = float(costs.read_dict_value(control, "writeInterval"))
+    write_format = costs.read_dict_value(control, "writeFormat")
+    write_precision = int(costs.read_dict_value(control, "writePrecision"))
+    compressed = costs.read_dict_value(control, "writeCompression") in [
+        "on", "yes", "true", "compressed"]
+    dt_0 = float(costs.read_dict_value(control, "deltaT"))
+    dims_0 = get_mesh_dims()
+    records = costs.load_timings()
+    coeffs = costs.fit_cost_model(records)
+    fitted = len(records) >= 3
+    ests = []
+    for p in points:
+        if "nx" in p:
+            dims = get_blockmesh_resolution(nx=p["nx"], base=dims_0)
         else:
-            mesh = False
-        # Update kwargs for this value
-        kwargs.update({param: p})
-        run(parallel=parallel, tee=tee, mesh=mesh, reconstruct=False,
-            post=False, **kwargs)
-        os.rename("log.pimpleFoam", "log.pimpleFoam." + str(p))
-        log_results(param=param, append=True)
-        foampy.clean(leave_mesh=True, remove_zero=True)
+            dims = dims_0
+        ncells = dims["nx"]*dims["ny"]*dims["nz"]
+        nturbines = sum(p.get(t + "_active", kwargs.get(t + "_active", "on"))
+                        == "on" for t in ["turbine1", "turbine2"])
+        dt = p.get("dt", dt_0)
+        est = costs.estimate_run(ncells, nprocs=nprocs, nturbines=nturbines,
+                                 dt=dt, end_time=end_time,
+                                 write_interval=write_interval,
+                                 write_format=write_format,
+                                 write_precision=write_precision,
+                                 compressed=compressed, coeffs=coeffs)
+        est["warnings"] = costs.check_disk(est["disk"],
+                                           write_format=write_format,
+                                           write_interval=write_interval,
+                                           dt=dt)
+        est["fitted"] = fitted
+        ests.append(est)
+    if not verbose:
+        return ests
+    print("Cost model fit to {} timing records".format(len(records))
+          if fitted else "Using default cost model ({} timing "
+          "records)".format(len(records)))
+    for p, est in zip(points, ests):
+        print("{}: {:.2f} h wall, {:.1f} core-hours, {:.2f} GB".format(
+              p if p else "Run", est["wall_time"]/3600, est["core_hours"],
+              est["disk"]/1e9))
+    disk = sum(e["disk"] for e in ests)
+    print("Total: {:.1f} core-hours, {:.2f} GB".format(
+          sum(e["core_hours"] for e in ests), disk/1e9))
+    nodes = costs.pack_points([e["wall_time"] for e in ests], nprocs=nprocs,
+                              cores_per_node=cores_per_node,
+                              max_walltime=max_walltime)
+    node_time = max(sum(ests[i]["wall_time"] for i in slot)
+                    for node in nodes for slot in node)
+    print("Packed onto {} node(s) of {} cores: {:.2f} h wall".format(
+          len(nodes), cores_per_node, node_time/3600))
+    warnings = costs.check_disk(disk, quota=disk_quota,
+                                write_format=write_format,
+                                write_interval=write_interval,
+                                dt=min(p.get("dt", dt_0) for p in points))
+    for w in warnings:
+        print("Warning: " + w)
+    return ests
+
+
+def multi_sweep(points, name="grid", append=False, parallel=True, tee=False,
+                resume=False, order=True, scheduler=None, nworkers=None,
+                max_retries=1, cores_per_node=None, max_walltime=None,
+                time_limit=None, **kwargs):
+    """Run simulations for a list of parameter dicts, ordered (if ``order``)
+    so the mesh and ``topoSet`` are rerun as few times as possible.
+
+    Results are logged to ``processed/{name}_sweep.csv`` and progress is
+    checkpointed so an interrupted sweep can be continued with ``resume``.
+    If ``scheduler`` is supplied, the points are run by `scheduled_sweep`.
+    """
+    if scheduler is not None:
+        scheduled_sweep(points, name=name, scheduler=scheduler,
+                        append=append, parallel=parallel, resume=resume,
+                        nworkers=nworkers,
+                        max_retries=max_retries,
+                        cores_per_node=cores_per_node,
+                        max_walltime=max_walltime, time_limit=time_limit,
+                        **kwargs)
+        return
+    from pynhtf.sweeps import plan_stages, point_label
+    fpath = "processed/{}_sweep.csv".format(name)
+    plan = plan_stages(points, order=order)
+    state = load_sweep_state(name) if resume else None
+    if state is None:
+        if resume:
+            print("No {} sweep to resume; starting from the first "
+                  "point".format(name))
+        elif not append and os.path.isfile(fpath):
+            os.remove(fpath)
+        # Original settings, restored when the sweep finishes
+        case = {"mesh": get_mesh_dims(), "dt": get_dt()}
+        state = {"points": [p for p, stage in plan], "done": [],
+                 "current": None, "case": case}
+    else:
+        if state["points"] != [p for p, stage in plan]:
+            print("Using the points planned when the sweep started")
+        plan = plan_stages(state["points"], order=False)
+        if state["current"] is None:
+            clean_case(leave_mesh=True)
+    nstages = {s: [st for p, st in plan].count(s)
+               for s in ["mesh", "topoSet", "sources"]}
+    print("Running {} sweep with {} points ({} mesh, {} topoSet)".format(
+          name, len(plan), nstages["mesh"], nstages["topoSet"]))
+    try:
+        for n, (p, stage) in enumerate(plan):
+            if n in state["done"]:
+                continue
+            restart = n == state["current"]
+            print("Running point {}/{} from {} stage: {}".format(
+                  n + 1, len(plan), stage, p))
+            run_kwargs = dict(kwargs)
+            run_kwargs.update({k: v for k, v in p.items()
+                               if k not in ["nx", "dt"]})
+            if stage == "mesh" and not restart:
+                clean_case()
+            if "nx" in p:
+                set_blockmesh_resolution(nx=p["nx"],
+                                         base=state["case"]["mesh"])
+            if "dt" in p:
+                set_dt(dt=p["dt"])
+            state["current"] = n
+            save_sweep_state(name, state)
+            run(parallel=parallel, tee=tee, mesh=stage == "mesh",
+                toposet=stage == "topoSet", reconstruct=False, post=False,
+                resume=restart, **run_kwargs)
+            os.rename("log.pimpleFoam",
+                      "log.pimpleFoam." + point_label(n, p))
+            log_results(param=name, append=True, params=p)
+            state["done"].append(n)
+            state["current"] = None
+            save_sweep_state(name, state)
+            clean_case(leave_mesh=True)
+    finally:
+        set_blockmesh_resolution(**state["case"]["mesh"])
+        set_dt(dt=state["case"]["dt"])
+    remove_sweep_state(name)
 
 
 def set_turbine_params(turbine1_tsr=6, turbine1_active="on", turbine1_x=0,
@@ -171,6 +554,7 @@ def set_turbine_params(turbine1_tsr=6, turbine1_active="on", turbine1_x=0,
 
     ``tsr_phase`` is in radians.
     """
+    import foampy
     args2 = {"turbine1_upstream_x": turbine1_x - 0.25,
              "turbine1_downstream_x": turbine1_x + 0.25,
              "turbine1_tower_x": turbine1_x + 0.48,
@@ -197,31 +581,88 @@ def run(turbine1_tsr=6, turbine1_active="on", turbine1_x=0,
         turbine2_tsr=4, turbine2_active="on", turbine2_x=2.682,
         turbine1_yaw=0, turbine2_yaw=0,
         mesh=True, parallel=False, tee=False, reconstruct=True,
-        overwrite=False, post=False, write_interval=None):
-    """Run simulation once."""
-    set_turbine_params(turbine1_tsr=turbine1_tsr,
-                       turbine1_active=turbine1_active,
-                       turbine1_x=turbine1_x,
-                       turbine2_tsr=turbine2_tsr,
-                       turbine2_active=turbine2_active,
-                       turbine2_x=turbine2_x,
-                       turbine1_yaw=turbine1_yaw,
-                       turbine2_yaw=turbine2_yaw)
-    if mesh:
-        foampy.run("blockMesh", tee=tee)
-    # Copy over initial conditions
-    subprocess.call("cp -rf 0.orig 0 > /dev/null 2>&1", shell=True)
-    if parallel and not glob.glob("processor*"):
-        foampy.run("decomposePar", tee=tee)
-        subprocess.call("for PROC in processor*; do cp -rf 0.orig/* $PROC/0; "
-                        " done", shell=True)
-    if mesh:
-        foampy.run("snappyHexMesh", args="-overwrite", tee=tee,
-                   parallel=parallel)
-        foampy.run("topoSet", parallel=parallel, tee=tee)
-        if parallel:
-            foampy.run("reconstructParMesh", args="-constant -time 0", tee=tee)
-    foampy.run("pimpleFoam", parallel=parallel, tee=tee, overwrite=overwrite)
+        overwrite=False, post=False, write_interval=None, toposet=False,
+        resume=False):
+    """Run simulation once.
+
+    ``topoSet`` is run if ``mesh`` or ``toposet`` is ``True``. If ``resume``
+    is ``True``, case setup is skipped and ``pimpleFoam`` is restarted from
+    the latest intact time directory, if there is one. Otherwise the case is
+    cleaned, keeping the mesh unless ``mesh`` is ``True``, and run from
+    t = 0, overwriting the logs of the interrupted run.
+    """
+    import foampy
+    if resume:
+        latest_time = find_latest_time(parallel=parallel)
+        if latest_time is None:
+            print("No intact time directory found; starting from t = 0")
+            clean_case(leave_mesh=not mesh)
+            resume = False
+            overwrite = True
+    if not resume:
+        set_turbine_params(turbine1_tsr=turbine1_tsr,
+                           turbine1_active=turbine1_active,
+                           turbine1_x=turbine1_x,
+                           turbine2_tsr=turbine2_tsr,
+                           turbine2_active=turbine2_active,
+                           turbine2_x=turbine2_x,
+                           turbine1_yaw=turbine1_yaw,
+                           turbine2_yaw=turbine2_yaw)
+        if mesh:
+            foampy.run("blockMesh", tee=tee)
+        # Copy over initial conditions
+        subprocess.call("cp -rf 0.orig 0 > /dev/null 2>&1", shell=True)
+        if parallel and not glob.glob("processor*"):
+            foampy.run("decomposePar", tee=tee)
+            subprocess.call("for PROC in processor*; do cp -rf 0.orig/* "
+                            "$PROC/0; done", shell=True)
+        if mesh:
+            foampy.run("snappyHexMesh", args="-overwrite", tee=tee,
+                       parallel=parallel)
+        if mesh or toposet:
+            foampy.run("topoSet", parallel=parallel, tee=tee,
+                       overwrite=overwrite or toposet)
+            if parallel:
+                foampy.run("reconstructParMesh", args="-constant -time 0",
+                           tee=tee, overwrite=overwrite or toposet)
+        foampy.run("pimpleFoam", parallel=parallel, tee=tee,
+                   overwrite=overwrite)
+        from pynhtf.costs import record_timing
+        dims = get_mesh_dims()
+        record_timing(ncells=dims["nx"]*dims["ny"]*dims["nz"],
+                      nprocs=get_nprocs() if parallel else 1,
+                      nturbines=[turbine1_active,
+                                 turbine2_active].count("on"),
+                      dt=get_dt())
+    else:
+        from foampy.dictionaries import replace_value
+        control = "system/controlDict"
+        end_time = read_dict_value(control, "endTime")
+        if float(latest_time) < float(end_time):
+            print("Resuming pimpleFoam from t = {}".format(latest_time))
+            # Keep the field averages accumulated before the restart
+            reset_on_restart = read_dict_value(control, "resetOnRestart")
+            replace_value(control, "startFrom", "latestTime")
+            try:
+                replace_value(control, "resetOnRestart", "false")
+                # Move incomplete later times aside so they aren't picked up
+                case_dirs = glob.glob("processor*") if parallel else ["."]
+                for d in case_dirs:
+                    for t in get_time_dirs(d):
+                        if float(t) > float(latest_time):
+                            os.rename(os.path.join(d, t),
+                                      os.path.join(d, t + ".incomplete"))
+                if os.path.isfile("log.pimpleFoam"):
+                    os.rename("log.pimpleFoam",
+                              "log.pimpleFoam.to-{}".format(latest_time))
+                foampy.run("pimpleFoam", parallel=parallel, tee=tee,
+                           overwrite=overwrite)
+            finally:
+                replace_value(control, "startFrom", "startTime")
+                replace_value(control, "resetOnRestart", reset_on_restart)
+        else:
+            print("pimpleFoam already reached t = {}".format(latest_time))
+        overwrite = True
     # Sample nacelle values
     gen_sets_file()
     foampy.run("postProcess", args="-func sets -latestTime",
@@ -236,6 +677,10 @@ def run(turbine1_tsr=6, turbine1_active="on", turbine1_x=0,
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Run NTNU HAWT ALM case")
+    parser.add_argument("command", nargs="?", default="run",
+                        choices=["run", "estimate"],
+                        help="Run the case or estimate the cost of a run or "
+                             "sweep")
     parser.add_argument("--turbine1-active", default="on")
     parser.add_argument("--turbine1-x", default=0, type=float)
     parser.add_argument("--turbine1-tsr", default=6.0, type=float)
@@ -244,6 +689,9 @@ if __name__ == "__main__":
     parser.add_argument("--turbine2-x", default=2.682, type=float)
     parser.add_argument("--turbine2-tsr", default=4.0, type=float)
     parser.add_argument("--turbine2-yaw", default=0.0, type=float)
+    parser.add_argument("--nx", type=int, help="Set blockMesh resolution, "
+                        "scaling ny and nz proportionally")
+    parser.add_argument("--dt", type=float, help="Set deltaT")
     parser.add_argument("--leave-mesh", "-l", default=False,
                         action="store_true", help="Leave existing mesh")
     parser.add_argument("--no-reconstruct", default=False, action="store_true",
@@ -255,9 +703,50 @@ if __name__ == "__main__":
                         help="Run multiple simulations varying a parameter",
                         choices=["turbine1_tsr", "turbine2_tsr",
                                  "turbine1_yaw", "turbine2_yaw"])
+    parser.add_argument("--grid", nargs="+", metavar="PARAM=VALUES",
+                        help="Run a grid sweep over multiple parameters, with "
+                             "comma-separated values or start:stop:step")
+    parser.add_argument("--lhs", metavar="N", type=int,
+                        help="Run N Latin hypercube samples within --bounds")
+    parser.add_argument("--bounds", nargs="+", metavar="PARAM=LOW:HIGH",
+                        help="Parameter bounds for --lhs")
+    parser.add_argument("--points", metavar="CSV",
+                        help="Run sweep points listed in a CSV file")
+    parser.add_argument("--sweep-name", help="Name for multi-parameter sweep "
+                        "results file")
+    parser.add_argument("--seed", type=int, help="Random seed for --lhs")
     parser.add_argument("--start", default=-30, type=float)
     parser.add_argument("--stop", default=31, type=float)
     parser.add_argument("--step", default=5, type=float)
+    parser.add_argument("--scheduler", choices=["local", "slurm", "fake-slurm"],
+                        help="Run sweep points as separate jobs with this "
+                             "backend")
+    parser.add_argument("--nworkers", type=int,
+                        help="Number of concurrent jobs for local scheduler "
+                             "(default: CPU count divided by processes per "
+                             "run)")
+    parser.add_argument("--max-retries", default=1, type=int,
+                        help="Number of times to resubmit failed sweep points")
+    parser.add_argument("--log-results", metavar="PARAM",
+                        help="Log results to processed/PARAM_sweep.csv after "
+                             "running")
+    parser.add_argument("--resume", "-r", default=False, action="store_true",
+                        help="Resume an interrupted run or sweep from the "
+                             "latest written time")
+    parser.add_argument("--cores-per-node", type=int,
+                        help="Cores per node for packing estimated runs "
+                             "(default: CPU count for the local scheduler, "
+                             "otherwise 32)")
+    parser.add_argument("--max-walltime", type=float,
+                        help="Maximum wall time per node in hours for packing "
+                             "estimated runs")
+    parser.add_argument("--time-limit", type=float,
+                        help="SLURM job time limit in hours (default 1.5 "
+                             "times the longest estimated run, if the cost "
+                             "model has been fit)")
+    parser.add_argument("--disk-quota", type=float,
+                        help="Disk quota in GB to check estimated output "
+                             "against")
     parser.add_argument("--serial", "-S", default=False, action="store_true")
     parser.add_argument("--append", "-a", default=False, action="store_true")
     parser.add_argument("--tee", "-T", default=False, action="store_true",
@@ -266,18 +755,73 @@ if __name__ == "__main__":
                         help="Clean case automatically before running")
     args = parser.parse_args()
 
-    if args.param_sweep:
-        param_sweep(args.param_sweep, args.start, args.stop, args.step,
-                    append=args.append, parallel=not args.serial, tee=args.tee,
-                    turbine1_active=args.turbine1_active,
-                    turbine1_tsr=args.turbine1_tsr,
-                    turbine1_x=args.turbine1_x,
-                    turbine1_yaw=args.turbine1_yaw,
-                    turbine2_active=args.turbine2_active,
-                    turbine2_tsr=args.turbine2_tsr,
-                    turbine2_x=args.turbine2_x,
-                    turbine2_yaw=args.turbine2_yaw)
+    turbine_kwargs = dict(turbine1_active=args.turbine1_active,
+                          turbine1_tsr=args.turbine1_tsr,
+                          turbine1_x=args.turbine1_x,
+                          turbine1_yaw=args.turbine1_yaw,
+                          turbine2_active=args.turbine2_active,
+                          turbine2_tsr=args.turbine2_tsr,
+                          turbine2_x=args.turbine2_x,
+                          turbine2_yaw=args.turbine2_yaw)
+
+    points = None
+    if args.grid or args.lhs or args.points:
+        from pynhtf import sweeps
+        if args.grid:
+            name = "grid"
+            values = {}
+            for spec in args.grid:
+                k, v = spec.split("=")
+                values[k] = sweeps.parse_values(v, param=k)
+            points = sweeps.grid_points(**values)
+        elif args.lhs:
+            if not args.bounds:
+                parser.error("--lhs requires --bounds")
+            name = "lhs"
+            bounds = {}
+            for spec in args.bounds:
+                k, v = spec.split("=")
+                bounds[k] = [float(b) for b in v.split(":")]
+            points = sweeps.lhs_points(args.lhs, seed=args.seed, **bounds)
+        else:
+            name = "list"
+            points = sweeps.list_points(args.points)
+        if args.sweep_name:
+            name = args.sweep_name
+    elif args.param_sweep and args.command == "estimate":
+        import numpy as np
+        dtype = int if args.param_sweep == "nx" else float
+        points = [{args.param_sweep: p} for p in np.arange(
+                  args.start, args.stop, args.step, dtype=dtype).tolist()]
+
+    if args.command == "estimate":
+        estimate(points, nprocs=1 if args.serial else None,
+                 cores_per_node=args.cores_per_node or 32,
+                 max_walltime=args.max_walltime*3600 if args.max_walltime
+                 else None,
+                 disk_quota=args.disk_quota*1e9 if args.disk_quota else None,
+                 **turbine_kwargs)
+    elif points is not None or args.param_sweep:
+        sweep_kwargs = dict(turbine_kwargs, append=args.append,
+                            parallel=not args.serial, tee=args.tee,
+                            resume=args.resume, scheduler=args.scheduler,
+                            nworkers=args.nworkers,
+                            max_retries=args.max_retries,
+                            cores_per_node=args.cores_per_node,
+                            max_walltime=args.max_walltime*3600
+                            if args.max_walltime else None,
+                            time_limit=args.time_limit*3600
+                            if args.time_limit else None)
+        if points is not None:
+            multi_sweep(points, name=name, **sweep_kwargs)
+        else:
+            param_sweep(args.param_sweep, args.start, args.stop, args.step,
+                        **sweep_kwargs)
     elif not args.post:
+        if args.nx is not None:
+            set_blockmesh_resolution(nx=args.nx)
+        if args.dt is not None:
+            set_dt(dt=args.dt)
         run(turbine1_active=args.turbine1_active,
             turbine1_tsr=args.turbine1_tsr,
             turbine1_x=args.turbine1_x,
@@ -290,7 +834,10 @@ if __name__ == "__main__":
             parallel=not args.serial,
             tee=args.tee,
             mesh=not args.leave_mesh,
-            overwrite=args.leave_mesh)
+            overwrite=args.leave_mesh,
+            resume=args.resume)
+        if args.log_results:
+            log_results(param=args.log_results, append=True)
     if args.post:
         post_process(parallel=not args.serial, tee=args.tee,
                      overwrite=args.overwrite)
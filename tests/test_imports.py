@@ -0,0 +1,10 @@
+"""Check import times of the orchestration modules against their budgets."""
+
+import os
+from pynhtf.benchmarks import check_imports
+
+case_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_import_budgets():
+    assert check_imports(case_dir=case_dir, verbose=False) == []
@@ -0,0 +1,83 @@
+"""Run sweeps through the SLURM executor with the local stand-in commands."""
+
+import os
+import pandas as pd
+from pynhtf import schedulers
+
+# Stand-in for run.py that fails the first attempt at turbine1_tsr = 5
+fake_run = """
+import os, sys
+argv = [a for a in sys.argv[1:] if a != "--resume"]
+args = dict(zip(argv[::2], argv[1::2]))
+tsr = args["--turbine1-tsr"]
+with open("log.pimpleFoam", "a") as f:
+    f.write(" ".join(sys.argv[1:]) + "\\n")
+flag = os.path.join({case_dir!r}, "failed." + tsr)
+if tsr == "5.0" and not os.path.exists(flag):
+    open(flag, "w").close()
+    sys.exit(1)
+os.makedirs("processed")
+with open(os.path.join("processed", args["--log-results"] + "_sweep.csv"),
+          "w") as f:
+    f.write("cp_turbine1\\n0.45\\n")
+"""
+
+
+def make_case(case_dir):
+    with open(os.path.join(case_dir, "run.py"), "w") as f:
+        f.write(fake_run.format(case_dir=str(case_dir)))
+
+
+def test_retry_and_collect(tmp_path):
+    make_case(tmp_path)
+    commands = schedulers.FakeSlurmCommands()
+    executor = schedulers.SlurmExecutor(tmp_path / "sweeps" / "test",
+                                        max_concurrent=1, commands=commands)
+    points = [{"turbine1_tsr": 4.0, "turbine1_yaw": 0.0},
+              {"turbine1_tsr": 5.0, "turbine1_yaw": 10.0}]
+    res = schedulers.run_sweep(executor, points, "test", case_dir=tmp_path,
+                               poll_interval=0.05, verbose=False)
+    assert [p.state for p in res] == [schedulers.DONE]*2
+    assert [p.attempts for p in res] == [1, 2]
+    assert commands.max_running == 1
+    df = pd.read_csv(tmp_path / "processed" / "test_sweep.csv")
+    assert df.turbine1_tsr.tolist() == [4.0, 5.0]
+    assert df.turbine1_yaw.tolist() == [0.0, 10.0]
+    log_dir = tmp_path / "processed" / "test_logs"
+    assert (log_dir / "0" / "log.pimpleFoam").is_file()
+    assert (log_dir / "1" / "attempt1" / "log.pimpleFoam").is_file()
+
+
+def test_failed_point_logs_collected(tmp_path):
+    make_case(tmp_path)
+    executor = schedulers.SlurmExecutor(
+        tmp_path / "sweeps" / "test",
+        commands=schedulers.FakeSlurmCommands())
+    res = schedulers.run_sweep(executor, [{"turbine1_tsr": 5.0}], "test",
+                               case_dir=tmp_path, max_retries=0,
+                               poll_interval=0.05, verbose=False)
+    assert res[0].state == schedulers.FAILED
+    assert not (tmp_path / "processed" / "test_sweep.csv").exists()
+    log_dir = tmp_path / "processed" / "test_logs" / "0"
+    assert (log_dir / "log.pimpleFoam").is_file()
+    assert (log_dir / "slurm.out").is_file()
+
+
+def test_resume(tmp_path):
+    make_case(tmp_path)
+    points = [{"turbine1_tsr": 4.0}, {"turbine1_tsr": 5.0}]
+    for resume in (False, True):
+        executor = schedulers.SlurmExecutor(
+            tmp_path / "sweeps" / "test",
+            commands=schedulers.FakeSlurmCommands())
+        res = schedulers.run_sweep(executor, points, "test", case_dir=tmp_path,
+                                   max_retries=0, poll_interval=0.05,
+                                   resume=resume, verbose=False)
+    assert [p.state for p in res] == [schedulers.DONE]*2
+    assert [p.attempts for p in res] == [0, 1]
+    workdir = tmp_path / "sweeps" / "test"
+    assert len((workdir / "0" / "log.pimpleFoam").read_text().split("\n")) == 2
+    log = (workdir / "1" / "log.pimpleFoam").read_text().split("\n")
+    assert "--resume" not in log[0] and "--resume" in log[1]
+    df = pd.read_csv(tmp_path / "processed" / "test_sweep.csv")
+    assert df.turbine1_tsr.tolist() == [4.0, 5.0]